@@ -0,0 +1,4 @@
+// qrscan.js calls the global jsQR, as it does with the CDN build.
+import jsQR from 'jsqr';
+
+window.jsQR = jsQR;
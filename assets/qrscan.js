@@ -0,0 +1,3 @@
+// Bundle entry for the scan page: jsQR + static/js/qrscan.js in one minified file.
+import './jsqr-global.js';
+import '../static/js/qrscan.js';
@@ -1,18 +1,79 @@
 from django.contrib import admin
-from .models import Account, Transaction, ProfitRecord, MoneyRequest
+from .models import (Account, Transaction, ProfitRecord, MoneyRequest, FeeSchedule, FeeRule, Statement, ArchiveMonth,
+                     ArchivedTransaction)
 
 @admin.register(Account)
 class AccountAdmin(admin.ModelAdmin):
     list_display = ('user','balance')
+    list_select_related = ('user',)
 
 @admin.register(Transaction)
 class TransactionAdmin(admin.ModelAdmin):
-    list_display = ('type','from_account','to_account','amount','fee','created_at')
+    list_display = ('type','from_account','to_account','amount','fee','fee_schedule','created_at')
+    list_select_related = ('from_account__user','to_account__user')
 
 @admin.register(ProfitRecord)
 class ProfitRecordAdmin(admin.ModelAdmin):
     list_display = ('transaction','amount','created_at')
+    list_select_related = ('transaction',)
 
 @admin.register(MoneyRequest)
 class MoneyRequestAdmin(admin.ModelAdmin):
     list_display = ('requester','target','amount','status','created_at')
+    list_select_related = ('requester__user','target__user')
+
+class FeeRuleInline(admin.TabularInline):
+    model = FeeRule
+    extra = 1
+    raw_id_fields = ('account',)
+    fields = ('type','account','min_amount','percent','flat','minimum_fee','cap')
+
+    def _locked(self, schedule):
+        # Active or used schedules are history: their rules only change through copy_as_new_version.
+        if schedule is None:
+            return False
+        if not hasattr(schedule, '_rules_locked'):
+            schedule._rules_locked = schedule.active or any(
+                model.objects.filter(fee_schedule=schedule).exists() for model in (Transaction, ArchivedTransaction))
+        return schedule._rules_locked
+
+    def get_readonly_fields(self, request, obj=None):
+        return self.fields if self._locked(obj) else super().get_readonly_fields(request, obj)
+
+    def has_add_permission(self, request, obj=None):
+        return not self._locked(obj) and super().has_add_permission(request, obj)
+
+    def has_change_permission(self, request, obj=None):
+        return not self._locked(obj) and super().has_change_permission(request, obj)
+
+    def has_delete_permission(self, request, obj=None):
+        return not self._locked(obj) and super().has_delete_permission(request, obj)
+
+@admin.register(FeeSchedule)
+class FeeScheduleAdmin(admin.ModelAdmin):
+    list_display = ('id','name','active','created_at')
+    inlines = (FeeRuleInline,)
+    actions = ('copy_as_new_version',)
+
+    @admin.action(description="Copy as a new (inactive) version")
+    def copy_as_new_version(self, request, queryset):
+        # Transactions point at the version that priced them, so change fees in a copy.
+        for schedule in queryset:
+            rules = list(schedule.rules.all())
+            copy = FeeSchedule.objects.create(name=schedule.name, note=f"Copied from v{schedule.id}")
+            for rule in rules:
+                rule.pk = None
+                rule.schedule = copy
+            FeeRule.objects.bulk_create(rules)
+            self.message_user(request, f"Created v{copy.id} from v{schedule.id}.")
+
+@admin.register(Statement)
+class StatementAdmin(admin.ModelAdmin):
+    list_display = ('account','period_start','period_end','opening_balance','closing_balance','entry_count','generated_at')
+    list_select_related = ('account__user',)
+    list_filter = ('period_start',)
+    raw_id_fields = ('account',)
+
+@admin.register(ArchiveMonth)
+class ArchiveMonthAdmin(admin.ModelAdmin):
+    list_display = ('month','transactions','profit_records','ledger_entries','export_path','archived_at')
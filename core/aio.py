@@ -0,0 +1,49 @@
+"""Support for the async views.
+
+Read paths use Django's async ORM directly. Ledger writes stay synchronous
+(they need ``select_for_update`` and ``transaction.atomic``) and run on a
+dedicated, bounded thread pool, so a burst of payments can't starve the
+default ``sync_to_async`` thread that renders templates.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from functools import wraps
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.shortcuts import render
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=settings.ASYNC_LEDGER_THREADS, thread_name_prefix='ledger')
+        return _executor
+
+
+def _with_connection_hygiene(func):
+    @wraps(func)
+    def inner(*args, **kwargs):
+        close_old_connections()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+    return inner
+
+
+async def run_write(func, *args, **kwargs):
+    """Run a synchronous ledger write on the dedicated write pool."""
+    return await sync_to_async(
+        _with_connection_hygiene(func), thread_sensitive=False, executor=_get_executor(),
+    )(*args, **kwargs)
+
+
+async def arender(request, template_name, context=None):
+    """``render()`` for async views; context processors touch the session and user synchronously."""
+    return await sync_to_async(render)(request, template_name, context)
@@ -0,0 +1,178 @@
+"""Hot/cold archival: old transactions leave the hot tables a month at a time.
+
+``archive_month()`` copies a month's ``Transaction``, ``ProfitRecord`` and
+``LedgerEntry`` rows into their ``Archived*`` twins (same ids, same columns)
+and deletes the originals, ``ARCHIVE_BATCH_SIZE`` transactions per database
+transaction. The hot tables then only hold the last ``ARCHIVE_RETENTION_DAYS``
+(rounded back to a month start), however many years of history there are.
+
+Before any entry of a book moves, the book gets a ``BalanceCheckpoint`` at or
+past its last entry in the month, so ``ledger.derived_balance`` (latest
+checkpoint plus later hot entries) never needs the archive. Readers of old
+periods (transaction history, statements, profit reports, rollup rebuilds,
+``verify_ledger``) combine both tables, and use ``ArchiveMonth.objects.horizon()``
+to skip the archive when a range doesn't reach it.
+
+With ``export``, an archived month is also written to storage as gzipped CSV
+files plus a manifest of row counts and checksums.
+"""
+import csv
+import gzip
+import hashlib
+import io
+import tempfile
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F, Max, Min
+from django.utils import timezone
+
+from . import ledger
+from .models import (
+    ArchiveMonth, ArchivedLedgerEntry, ArchivedProfitRecord, ArchivedTransaction, BalanceCheckpoint, LedgerEntry,
+    ProfitRecord, Transaction,
+)
+from .utils import replace_stored_file
+
+ARCHIVE_DIR = 'archive'
+MANIFEST_HEADER = ['table', 'file', 'rows', 'sha256']
+# (hot model, archive model, ArchiveMonth counter), in insert order: archived rows reference archived transactions.
+TABLES = [
+    (Transaction, ArchivedTransaction, 'transactions'),
+    (ProfitRecord, ArchivedProfitRecord, 'profit_records'),
+    (LedgerEntry, ArchivedLedgerEntry, 'ledger_entries'),
+]
+
+
+def _aware(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _next_month(day):
+    return day.replace(year=day.year + day.month // 12, month=day.month % 12 + 1)
+
+
+def cutoff(retention_days=None):
+    """First day of the month holding the retention boundary; months before it can be archived."""
+    days = settings.ARCHIVE_RETENTION_DAYS if retention_days is None else retention_days
+    return (timezone.localdate() - timedelta(days=days)).replace(day=1)
+
+
+def pending_months(before):
+    """First days of the months before ``before`` that still have hot transactions, oldest first."""
+    first = Transaction.objects.filter(created_at__lt=_aware(before)).aggregate(first=Min('created_at'))['first']
+    months = []
+    month = first and timezone.localdate(first).replace(day=1)
+    while month and month < before:
+        months.append(month)
+        month = _next_month(month)
+    return months
+
+
+def _by_transaction(model, ids):
+    field = 'id' if model is Transaction else 'transaction_id'
+    return model.objects.filter(**{f"{field}__in": ids})
+
+
+def _checkpoint_books(end):
+    """Checkpoint every book touched by transactions before ``end`` at or past its last such entry."""
+    lasts = (LedgerEntry.objects.filter(transaction__created_at__lt=end).order_by()
+             .values('book', 'account_id').annotate(last=Max('id')).values_list('book', 'account_id', 'last'))
+    for book, account_id, last in lasts.iterator():
+        if BalanceCheckpoint.objects.filter(book=book, account_id=account_id, entry_id__gte=last).exists():
+            continue
+        written = ledger.checkpoint(account_id, book=book)
+        if written is None or written.entry_id < last:
+            raise RuntimeError(f"Could not checkpoint {book}:{account_id or '-'} past entry {last}; not archiving.")
+
+
+def _move_batch(start, end, batch_size):
+    """Move the oldest ``batch_size`` transactions of the month; returns per-table counts, or None when done."""
+    with transaction.atomic():
+        ids = list(Transaction.objects.filter(created_at__gte=start, created_at__lt=end)
+                   .order_by('id').values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return None
+        moved = {}
+        for model, archived, counter in TABLES:
+            fields = [f.attname for f in model._meta.concrete_fields]
+            rows = [archived(**row) for row in _by_transaction(model, ids).values(*fields)]
+            archived.objects.bulk_create(rows, batch_size=1000)
+            moved[counter] = len(rows)
+        # Entries protect their transaction, so delete children first.
+        for model, _, _ in reversed(TABLES):
+            _by_transaction(model, ids).delete()
+        return moved
+
+
+def archive_month(month, batch_size=None, export=False, progress=None):
+    """Move one month (``month`` is its first day) into the archive; returns its ``ArchiveMonth``.
+
+    Safe to re-run: an interrupted month carries on where it stopped.
+    ``progress`` is called with the month's running counts after each batch.
+    """
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    start, end = _aware(month), _aware(_next_month(month))
+    record, _ = ArchiveMonth.objects.get_or_create(month=month)
+    _checkpoint_books(end)
+    while (moved := _move_batch(start, end, batch_size)) is not None:
+        ArchiveMonth.objects.filter(pk=record.pk).update(**{
+            counter: F(counter) + count for counter, count in moved.items()})
+        if progress is not None:
+            record.refresh_from_db()
+            progress(record)
+    updates = {'archived_at': timezone.now()}
+    if export:
+        updates['export_path'] = export_month(month)
+    ArchiveMonth.objects.filter(pk=record.pk).update(**updates)
+    record.refresh_from_db()
+    return record
+
+
+def archive(before, batch_size=None, export=False, progress=None):
+    """Archive every month before ``before``, oldest first, yielding each finished ``ArchiveMonth``."""
+    for month in pending_months(before):
+        yield archive_month(month, batch_size=batch_size, export=export, progress=progress)
+
+
+def _export_table(model, start, end, name):
+    field = 'created_at' if model is ArchivedTransaction else 'transaction__created_at'
+    rows = (model.objects.filter(**{f"{field}__gte": start, f"{field}__lt": end}).order_by('id')
+            .values_list(*[f.attname for f in model._meta.concrete_fields])
+            .iterator(chunk_size=settings.REPORT_CHUNK_SIZE))
+    count = 0
+    with tempfile.TemporaryFile() as raw:
+        # mtime=0 keeps the output byte-identical across re-exports.
+        with gzip.GzipFile(fileobj=raw, mode='wb', mtime=0) as compressed:
+            text = io.TextIOWrapper(compressed, encoding='utf-8', newline='')
+            writer = csv.writer(text)
+            writer.writerow([f.attname for f in model._meta.concrete_fields])
+            for row in rows:
+                writer.writerow(value.isoformat() if isinstance(value, datetime) else value for value in row)
+                count += 1
+            text.flush()
+            text.detach()
+        raw.seek(0)
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: raw.read(1 << 16), b''):
+            digest.update(chunk)
+        raw.seek(0)
+        path = replace_stored_file(name, name, File(raw))
+    return path, count, digest.hexdigest()
+
+
+def export_month(month):
+    """Write an archived month to storage as gzipped CSV per table plus a manifest; returns the manifest path."""
+    start, end = _aware(month), _aware(_next_month(month))
+    directory = f"{ARCHIVE_DIR}/{month:%Y-%m}"
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(MANIFEST_HEADER)
+    for _, model, counter in TABLES:
+        path, count, digest = _export_table(model, start, end, f"{directory}/{counter}.csv.gz")
+        writer.writerow([counter, path, count, digest])
+    name = f"{directory}/manifest.csv"
+    return replace_stored_file(name, name, ContentFile(buffer.getvalue().encode()))
@@ -0,0 +1,147 @@
+"""Cached request user and lazy ``request.account``.
+
+``CachedAuthenticationMiddleware`` replaces Django's ``AuthenticationMiddleware``.
+The session's user and its ``Account`` are loaded together with one
+``select_related`` query and kept as per-user fragments in ``core.caching``
+for ``AUTH_CACHE_TTL`` seconds. The ledger bumps the fragment version on every
+balance change and a ``User`` save or delete does the same, so the cached
+account never shows a stale balance and a password change or deactivation
+takes effect on the next request. The session auth hash is still checked on
+every request; anything unusual (another backend, a hash mismatch) falls
+back to Django's own ``get_user``.
+"""
+from functools import partial
+
+from django.conf import settings
+from django.contrib import auth
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.contrib.auth.models import User
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.crypto import constant_time_compare
+from django.utils.functional import SimpleLazyObject
+
+from . import caching
+from .models import Account
+
+MODEL_BACKEND = 'django.contrib.auth.backends.ModelBackend'
+
+
+def _session_user_id(request):
+    session = request.session
+    if session.get(auth.BACKEND_SESSION_KEY) != MODEL_BACKEND or auth.SESSION_KEY not in session:
+        return None
+    return User._meta.pk.to_python(session[auth.SESSION_KEY])
+
+
+def _load(user_id):
+    account = Account.objects.select_related('user').filter(user_id=user_id).first()
+    return account.user if account else User.objects.filter(pk=user_id).first()
+
+
+async def _aload(user_id):
+    account = await Account.objects.select_related('user').filter(user_id=user_id).afirst()
+    return account.user if account else await User.objects.filter(pk=user_id).afirst()
+
+
+def _builders(user_id):
+    # select_related leaves the account on the user, so 'account' needs no query.
+    return {
+        'user': lambda f: _load(user_id),
+        'account': lambda f: _account_of(f['user']),
+    }
+
+
+def _abuilders(user_id):
+    async def user(f):
+        return await _aload(user_id)
+
+    async def account(f):
+        return _account_of(f['user'])
+
+    return {'user': user, 'account': account}
+
+
+def _account_of(user):
+    if user is None:
+        return None
+    try:
+        return user.account
+    except Account.DoesNotExist:
+        return None
+
+
+def _verified(request, found):
+    user, account = found['user'], found['account']
+    if user is None or not user.is_active:
+        return None
+    session_hash = request.session.get(auth.HASH_SESSION_KEY)
+    if not session_hash or not constant_time_compare(session_hash, user.get_session_auth_hash()):
+        return None
+    if account is not None:
+        account.user = user
+    request._cached_account = account
+    return user
+
+
+def get_user(request):
+    user_id = _session_user_id(request)
+    if user_id is not None:
+        found = caching.fragments(user_id, _builders(user_id), timeout=settings.AUTH_CACHE_TTL)
+        user = _verified(request, found)
+        if user is not None:
+            return user
+    return auth.get_user(request)
+
+
+async def aget_user(request):
+    if not hasattr(request, '_acached_user'):
+        user_id = await _asession_user_id(request)
+        user = None
+        if user_id is not None:
+            found = await caching.afragments(user_id, _abuilders(user_id), timeout=settings.AUTH_CACHE_TTL)
+            user = _verified(request, found)
+        request._acached_user = user if user is not None else await auth.aget_user(request)
+    return request._acached_user
+
+
+async def _asession_user_id(request):
+    session = request.session
+    if await session.aget(auth.BACKEND_SESSION_KEY) != MODEL_BACKEND:
+        return None
+    user_id = await session.aget(auth.SESSION_KEY)
+    return None if user_id is None else User._meta.pk.to_python(user_id)
+
+
+def get_account(request):
+    """The current user's ``Account`` (None for anonymous users), loaded once per request."""
+    authenticated = request.user.is_authenticated  # resolving the user usually caches the account
+    if not hasattr(request, '_cached_account'):
+        request._cached_account = (Account.objects.filter(user_id=request.user.pk).first()
+                                   if authenticated else None)
+    return request._cached_account
+
+
+async def aget_account(request):
+    user = await request.auser()
+    if not hasattr(request, '_cached_account'):
+        request._cached_account = (await Account.objects.filter(user_id=user.pk).afirst()
+                                   if user.is_authenticated else None)
+    return request._cached_account
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    """``AuthenticationMiddleware`` backed by the per-user cache; adds ``request.account``."""
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: get_user(request))
+        request.auser = partial(aget_user, request)
+        request.account = SimpleLazyObject(lambda: get_account(request))
+        request.aaccount = partial(aget_account, request)
+
+
+@receiver([post_save, post_delete], sender=User)
+def _user_changed(sender, instance, raw=False, **kwargs):
+    if not raw:
+        caching.invalidate(instance.pk)
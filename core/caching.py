@@ -0,0 +1,101 @@
+"""Per-user fragment cache for the dashboard.
+
+Fragments are stored under keys that embed a per-user version number. The
+ledger bumps that version after every committed balance change, so a stale
+fragment is simply never looked up again and expires on its own TTL.
+"""
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from . import metrics
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _cache():
+    return caches[settings.DASHBOARD_CACHE_ALIAS]
+
+
+def _version_key(user_id):
+    return f"dash:{user_id}:v"
+
+
+def _count(outcome, n=1):
+    with _stats_lock:
+        _stats[outcome] += n
+    metrics.record_cache(outcome, n)
+
+
+def stats():
+    """Hit/miss counters for this process."""
+    with _stats_lock:
+        hits, misses = _stats['hit'], _stats['miss']
+    total = hits + misses
+    return {'hits': hits, 'misses': misses, 'hit_ratio': round(hits / total, 4) if total else None}
+
+
+def fragments(user_id, builders, timeout=None):
+    """Return ``{name: value}`` for each fragment, building misses.
+
+    ``builders`` maps fragment names to callables taking the dict of fragments
+    resolved so far, so later fragments can depend on earlier ones. Misses are
+    kept for ``timeout`` seconds (default ``DASHBOARD_CACHE_TTL``).
+    """
+    cache = _cache()
+    version = cache.get_or_set(_version_key(user_id), time.time_ns, timeout=None)
+    keys = {name: f"dash:{user_id}:{version}:{name}" for name in builders}
+    found = cache.get_many(keys.values())
+    result, missing = {}, {}
+    for name, build in builders.items():
+        if keys[name] in found:
+            result[name] = found[keys[name]]
+        else:
+            result[name] = missing[keys[name]] = build(result)
+    _count('hit', len(builders) - len(missing))
+    _count('miss', len(missing))
+    if missing:
+        cache.set_many(missing, timeout=timeout or settings.DASHBOARD_CACHE_TTL)
+    return result
+
+
+def _bump(user_ids):
+    cache = _cache()
+    for user_id in user_ids:
+        key = _version_key(user_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            # No version yet (or evicted): start from the clock so old keys can't match.
+            cache.set(key, time.time_ns(), timeout=None)
+
+
+def invalidate(*user_ids):
+    """Drop cached fragments for these users once the current transaction commits."""
+    user_ids = {u for u in user_ids if u is not None}
+    if user_ids:
+        transaction.on_commit(lambda: _bump(user_ids))
+
+
+async def afragments(user_id, builders, timeout=None):
+    """Async version of ``fragments()``; ``builders`` are coroutine functions."""
+    cache = _cache()
+    version = await cache.aget_or_set(_version_key(user_id), time.time_ns, timeout=None)
+    keys = {name: f"dash:{user_id}:{version}:{name}" for name in builders}
+    found = await cache.aget_many(keys.values())
+    result, missing = {}, {}
+    for name, build in builders.items():
+        if keys[name] in found:
+            result[name] = found[keys[name]]
+        else:
+            result[name] = missing[keys[name]] = await build(result)
+    _count('hit', len(builders) - len(missing))
+    _count('miss', len(missing))
+    if missing:
+        await cache.aset_many(missing, timeout=timeout or settings.DASHBOARD_CACHE_TTL)
+    return result
@@ -0,0 +1,6 @@
+from django.conf import settings
+
+
+def assets(request):
+    """Whether templates can use the locally built bundles in ``static/dist/``."""
+    return {'assets_bundled': settings.ASSETS_BUNDLED}
@@ -0,0 +1,57 @@
+"""Send reads from history and report views to the read replica, if configured.
+
+Views opt in with ``@read_from_replica``; everything else (and all writes)
+stays on ``default``, so request flows that write then read see their writes.
+"""
+from contextvars import ContextVar
+from functools import wraps
+from inspect import iscoroutinefunction
+
+from django.conf import settings
+
+REPLICA = 'replica'
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_alias():
+    """The alias report queries should use: the replica when configured and enabled."""
+    if _use_replica.get() and REPLICA in settings.DATABASES:
+        return REPLICA
+    return 'default'
+
+
+def read_from_replica(view):
+    if iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(request, *args, **kwargs):
+            token = _use_replica.set(True)
+            try:
+                return await view(request, *args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        token = _use_replica.set(True)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in ('auth', 'sessions', 'contenttypes', 'admin'):
+            return 'default'
+        return replica_alias()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
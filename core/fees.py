@@ -0,0 +1,174 @@
+"""Fee engine: prices transactions from the active ``FeeSchedule``.
+
+The schedule is compiled once into per-type tier tables (sorted lower
+bounds, rates already divided by 100) and kept in process. Editing a
+schedule or rule bumps a generation number in the shared cache; every
+process re-compiles the next time it looks past ``FEE_SCHEDULE_RECHECK``
+seconds. Pricing itself never touches the database, so bulk paths can
+price thousands of rows per call.
+"""
+import threading
+import time
+from bisect import bisect_right
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import FeeRule, FeeSchedule, Transaction
+
+CENTS = Decimal('0.01')
+HUNDRED = Decimal('100')
+GENERATION_KEY = 'fees:generation'
+
+
+class Tier:
+    __slots__ = ('rate', 'flat', 'minimum', 'cap')
+
+    def __init__(self, percent, flat=0, minimum=None, cap=None):
+        self.rate = Decimal(percent) / HUNDRED
+        self.flat = Decimal(flat)
+        self.minimum = minimum
+        self.cap = cap
+
+    def fee(self, amount):
+        fee = (amount * self.rate + self.flat).quantize(CENTS)
+        if self.minimum is not None and fee < self.minimum:
+            fee = self.minimum
+        if self.cap is not None and fee > self.cap:
+            fee = self.cap
+        return fee
+
+
+class TierTable:
+    """Tiers for one (type, account) keyed by their lower bound."""
+    __slots__ = ('bounds', 'tiers')
+
+    def __init__(self, rules):
+        rules = sorted(rules, key=lambda r: r[0])
+        self.bounds = [bound for bound, _ in rules]
+        self.tiers = [tier for _, tier in rules]
+
+    def fee(self, amount):
+        i = bisect_right(self.bounds, amount) - 1
+        return self.tiers[i].fee(amount) if i >= 0 else Decimal('0.00')
+
+
+class CompiledSchedule:
+    def __init__(self, version, tables, overrides):
+        self.version = version  # FeeSchedule id, or None for the settings fallback
+        self._tables = tables  # {type: TierTable}
+        self._overrides = overrides  # {(type, account_id): TierTable}
+
+    def _table(self, tx_type, account_id):
+        if account_id is not None and self._overrides:
+            table = self._overrides.get((tx_type, account_id))
+            if table is not None:
+                return table
+        return self._tables.get(tx_type)
+
+    def fee(self, tx_type, amount, account_id=None):
+        table = self._table(tx_type, account_id)
+        return table.fee(amount) if table is not None else Decimal('0.00')
+
+    def fees(self, tx_type, amounts, account_ids=None):
+        """Price many amounts at once; ``account_ids`` is a parallel list or a single id."""
+        if account_ids is None or not isinstance(account_ids, (list, tuple)):
+            table = self._table(tx_type, account_ids)
+            if table is None:
+                return [Decimal('0.00')] * len(amounts)
+            return [table.fee(amount) for amount in amounts]
+        return [self.fee(tx_type, amount, acc) for amount, acc in zip(amounts, account_ids)]
+
+    def describe(self, tx_type):
+        """Human summary of the general tiers for ``tx_type`` (for the admin dashboard)."""
+        table = self._tables.get(tx_type)
+        if table is None:
+            return "free"
+        parts = []
+        for bound, tier in zip(table.bounds, table.tiers):
+            text = f"{(tier.rate * HUNDRED).normalize():f}%"
+            if tier.flat:
+                text += f" + Rs.{tier.flat}"
+            if tier.minimum is not None:
+                text += f", min Rs.{tier.minimum}"
+            if tier.cap is not None:
+                text += f", cap Rs.{tier.cap}"
+            parts.append(f"from Rs.{bound}: {text}" if len(table.bounds) > 1 else text)
+        return "; ".join(parts)
+
+
+def _from_settings():
+    tables = {
+        tx_type: TierTable([(Decimal('0.00'), Tier(Decimal(str(percent))))])
+        for tx_type, percent in (
+            (Transaction.TRANSFER, settings.TRANSFER_FEE_PERCENT),
+            (Transaction.DEPOSIT, settings.DEPOSIT_FEE_PERCENT),
+            (Transaction.WITHDRAW, settings.WITHDRAW_FEE_PERCENT),
+        )
+    }
+    return CompiledSchedule(None, tables, {})
+
+
+def compile_schedule(schedule=None):
+    """Build the lookup structure for ``schedule`` (default: the newest active one)."""
+    if schedule is None:
+        schedule = FeeSchedule.objects.filter(active=True).order_by('-id').first()
+        if schedule is None:
+            return _from_settings()
+    grouped = {}
+    for rule in FeeRule.objects.filter(schedule=schedule).order_by('id'):
+        tier = Tier(rule.percent, rule.flat, rule.minimum_fee, rule.cap)
+        grouped.setdefault((rule.type, rule.account_id), {})[rule.min_amount] = tier
+    tables, overrides = {}, {}
+    for (tx_type, account_id), tiers in grouped.items():
+        table = TierTable(tiers.items())
+        if account_id is None:
+            tables[tx_type] = table
+        else:
+            overrides[(tx_type, account_id)] = table
+    return CompiledSchedule(schedule.id, tables, overrides)
+
+
+_lock = threading.Lock()
+_state = {'compiled': None, 'generation': None, 'checked': 0.0}
+
+
+def _cache():
+    return caches[settings.FEE_SCHEDULE_CACHE_ALIAS]
+
+
+def current():
+    """The compiled active schedule, re-compiled when another process has edited it."""
+    now = time.monotonic()
+    compiled = _state['compiled']
+    if compiled is not None and now - _state['checked'] < settings.FEE_SCHEDULE_RECHECK:
+        return compiled
+    generation = _cache().get(GENERATION_KEY)
+    with _lock:
+        if _state['compiled'] is None or generation != _state['generation']:
+            _state['compiled'] = compile_schedule()
+            _state['generation'] = generation
+        _state['checked'] = now
+        return _state['compiled']
+
+
+def invalidate():
+    """Force every process to re-compile on its next lookup."""
+    try:
+        _cache().incr(GENERATION_KEY)
+    except ValueError:
+        _cache().set(GENERATION_KEY, time.time_ns(), timeout=None)
+    with _lock:
+        _state['compiled'] = None
+
+
+@receiver([post_save, post_delete], sender=FeeSchedule)
+@receiver([post_save, post_delete], sender=FeeRule)
+def _schedule_changed(sender, **kwargs):
+    if not kwargs.get('raw'):
+        # After commit, or a process could re-compile the old rows and keep them.
+        transaction.on_commit(invalidate)
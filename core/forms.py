@@ -2,8 +2,10 @@ from django import forms
 from django.contrib.auth.models import User
 from .models import MoneyRequest
 
+RECIPIENT_ATTRS = {'list': 'recipient-options', 'autocomplete': 'off', 'data-recipient-search': ''}
+
 class TransferForm(forms.Form):
-    to_username = forms.CharField(label='To (username)')
+    to_username = forms.CharField(label='To (username)', widget=forms.TextInput(attrs=RECIPIENT_ATTRS))
     amount = forms.DecimalField(decimal_places=2, max_digits=12, min_value=0.01)
     note = forms.CharField(required=False)
 
@@ -22,6 +24,21 @@ class AdminUserForm(forms.Form):
     email = forms.EmailField(required=False)
 
 class AdminDepositForm(forms.Form):
-    username = forms.CharField(label="To username")
+    username = forms.CharField(label="To username", widget=forms.TextInput(attrs=RECIPIENT_ATTRS))
     amount = forms.DecimalField(decimal_places=2, max_digits=12, min_value=0.01)
     note = forms.CharField(required=False)
+
+class BulkTransferForm(forms.Form):
+    file = forms.FileField(required=False, help_text="CSV or JSON list of to_username, amount, note")
+    rows = forms.CharField(required=False, widget=forms.Textarea(attrs={'rows': 6}),
+                           help_text="Or paste rows here, one 'username,amount,note' per line")
+
+    def clean(self):
+        cleaned = super().clean()
+        if not cleaned.get('file') and not cleaned.get('rows'):
+            raise forms.ValidationError("Upload a file or paste some rows.")
+        return cleaned
+
+class UserImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV with a header: username, password, email, first_name, last_name, opening_balance")
+    qr = forms.BooleanField(required=False, label="Render QR codes during the import")
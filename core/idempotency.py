@@ -0,0 +1,161 @@
+"""Idempotency keys for money-moving endpoints.
+
+A client sends a key (``Idempotency-Key`` header, or the ``idempotency_key``
+form/query field rendered by ``{% idempotency_field %}``). The first request
+with a key claims it, runs the view and stores its response; duplicates
+replay that response and never touch ``Account`` rows.
+
+Only the key bookkeeping is transactional: the view runs in its own
+transactions (a bulk transfer commits chunk by chunk), so one request never
+holds the write lock for its whole duration. While the view runs, the claim's
+lease is renewed every ``IDEMPOTENCY_HEARTBEAT`` seconds, so a slow request
+(a large bulk transfer, a wait on row locks) is never run a second time; a
+claim whose worker was killed mid-request lapses ``IDEMPOTENCY_LEASE`` seconds
+after its last renewal rather than when the key expires.
+"""
+import hashlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.contrib import messages
+from django.db import DatabaseError, IntegrityError, connection, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+HEADER = 'HTTP_IDEMPOTENCY_KEY'
+FIELD = 'idempotency_key'
+REPLAYED_HEADERS = ('Location', 'Content-Type')
+
+logger = logging.getLogger(__name__)
+
+
+def request_key(request):
+    key = request.META.get(HEADER) or request.POST.get(FIELD) or request.GET.get(FIELD)
+    return key.strip()[:64] if key else None
+
+
+def _fingerprint(request):
+    """Hash of what the request asks for, so a reused key with a different payload is refused."""
+    payload = sorted(
+        (name, value) for name, values in request.POST.lists() if name not in (FIELD, 'csrfmiddlewaretoken')
+        for value in values
+    )
+    return hashlib.sha256(repr((request.method, request.path, payload)).encode()).hexdigest()
+
+
+def _claim(request, key, fingerprint):
+    """Claim the key: ``(claimed_at, None)`` if we own it, else ``(None, existing row)``."""
+    now = timezone.now()
+    keys = IdempotencyKey.objects.filter(user=request.user, key=key)
+    keys.filter(expires_at__lte=now).delete()
+    # An in-flight claim past its lease belongs to a worker that died mid-request; take it over.
+    lapsed = keys.filter(fingerprint=fingerprint, status=IdempotencyKey.IN_FLIGHT,
+                         renewed_at__lte=now - timedelta(seconds=settings.IDEMPOTENCY_LEASE))
+    if lapsed.update(claimed_at=now, renewed_at=now):
+        return now, None
+    try:
+        with transaction.atomic():
+            IdempotencyKey.objects.create(
+                user=request.user, key=key, fingerprint=fingerprint, claimed_at=now, renewed_at=now,
+                expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_TTL),
+            )
+        return now, None
+    except IntegrityError:
+        return None, keys.first()
+
+
+def _renew(record_filter, stopped):
+    try:
+        while not stopped.wait(settings.IDEMPOTENCY_HEARTBEAT):
+            try:
+                IdempotencyKey.objects.filter(**record_filter, status=IdempotencyKey.IN_FLIGHT).update(
+                    renewed_at=timezone.now())
+            except DatabaseError:
+                # e.g. SQLite busy behind the view's own write; the next beat tries again.
+                logger.warning("Could not renew idempotency key %s", record_filter['key'], exc_info=True)
+    finally:
+        connection.close()  # this thread's connection
+
+
+@contextmanager
+def _heartbeat(record_filter):
+    """Renew the claim's lease from a side thread until the block exits."""
+    stopped = threading.Event()
+    thread = threading.Thread(target=_renew, args=(record_filter, stopped), daemon=True,
+                              name=f"idempotency-{record_filter['key']}-heartbeat")
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def _wait_for(record):
+    """Poll an in-flight key until its original request finishes or we give up."""
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+    while record is not None and record.status == IdempotencyKey.IN_FLIGHT and time.monotonic() < deadline:
+        time.sleep(0.05)
+        record = IdempotencyKey.objects.filter(pk=record.pk).first()
+    return record
+
+
+def _replay(request, record):
+    response = HttpResponse(bytes(record.response_body), status=record.response_status)
+    for name, value in record.response_headers.items():
+        response[name] = value
+    response['Idempotent-Replayed'] = 'true'
+    if response.status_code in (301, 302, 303):
+        messages.info(request, "This request was already processed.")
+    return response
+
+
+def _store(record_filter, response):
+    body = b'' if response.streaming else response.content
+    if len(body) > settings.IDEMPOTENCY_MAX_BODY:
+        body = b''
+    IdempotencyKey.objects.filter(**record_filter).update(
+        status=IdempotencyKey.DONE,
+        response_status=response.status_code,
+        response_headers={h: response[h] for h in REPLAYED_HEADERS if response.has_header(h)},
+        response_body=body,
+    )
+
+
+def idempotent(view):
+    """Make a view safe to retry when the client supplies an idempotency key."""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request_key(request)
+        if not key:
+            return view(request, *args, **kwargs)
+        fingerprint = _fingerprint(request)
+        claimed_at, existing = _claim(request, key, fingerprint)
+        if claimed_at is None:
+            existing = _wait_for(existing)
+            if existing is None:
+                return HttpResponse("Idempotency key expired while waiting; retry.", status=409)
+            if existing.fingerprint != fingerprint:
+                return HttpResponse("Idempotency key reused with a different request.", status=422)
+            if existing.status == IdempotencyKey.IN_FLIGHT:
+                return HttpResponse("A request with this idempotency key is still in progress.", status=409)
+            return _replay(request, existing)
+
+        # Scoped to our claim, so a worker whose lease was taken over can't overwrite the new owner.
+        record_filter = {'user': request.user, 'key': key, 'claimed_at': claimed_at}
+        try:
+            with _heartbeat(record_filter):
+                response = view(request, *args, **kwargs)
+        except Exception:
+            IdempotencyKey.objects.filter(**record_filter, status=IdempotencyKey.IN_FLIGHT).delete()
+            raise
+        _store(record_filter, response)
+        return response
+    return wrapper
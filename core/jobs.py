@@ -0,0 +1,178 @@
+"""Database-backed background jobs.
+
+Handlers are registered with ``@task('name')`` and queued with ``enqueue()``;
+the job row commits with the caller's transaction, so work is never queued for
+a write that rolled back. ``manage.py run_workers`` claims queued jobs with
+``SELECT ... FOR UPDATE SKIP LOCKED`` so any number of worker processes can
+drain the queue without blocking on each other. A failed job is retried with
+exponential backoff until ``max_attempts``. While a job runs, its worker
+renews the lease every ``JOB_HEARTBEAT`` seconds, so long jobs (statements,
+imports) keep it; a job whose worker died is re-queued once its lease
+(``JOB_LEASE``) runs out.
+"""
+import logging
+import os
+import socket
+import threading
+import traceback
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def task(name):
+    """Register ``func(payload)`` as the handler for jobs named ``name``."""
+    def register(func):
+        _registry[name] = func
+        return func
+    return register
+
+
+def registered():
+    return sorted(_registry)
+
+
+def enqueue(name, payload=None, priority=0, delay=0, max_attempts=None, user=None):
+    if name not in _registry:
+        raise ValueError(f"Unknown job task: {name!r}")
+    return Job.objects.create(
+        task=name,
+        payload=payload or {},
+        priority=priority,
+        run_at=timezone.now() + timedelta(seconds=delay),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        created_by=user if user is not None and user.is_authenticated else None,
+    )
+
+
+def enqueue_many(name, payloads, priority=0, user=None):
+    if name not in _registry:
+        raise ValueError(f"Unknown job task: {name!r}")
+    now = timezone.now()
+    created_by = user if user is not None and user.is_authenticated else None
+    return Job.objects.bulk_create([
+        Job(task=name, payload=payload, priority=priority, run_at=now,
+            max_attempts=settings.JOB_MAX_ATTEMPTS, created_by=created_by)
+        for payload in payloads
+    ])
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim(worker, limit=1):
+    """Lock and mark up to ``limit`` due jobs as running for ``worker``."""
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            Job.objects.select_for_update(skip_locked=True)
+            .filter(status=Job.QUEUED, run_at__lte=now)
+            .order_by('-priority', 'run_at', 'id')
+            .values_list('id', flat=True)[:limit]
+        )
+        if not ids:
+            return []
+        # The status guard keeps this safe on backends without row locks (SQLite).
+        Job.objects.filter(id__in=ids, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_by=worker, locked_at=now)
+        return list(Job.objects.filter(id__in=ids, status=Job.RUNNING, locked_by=worker, locked_at=now)
+                    .order_by('-priority', 'run_at', 'id'))
+
+
+def requeue_stale():
+    """Put back jobs whose worker stopped renewing its lease (crashed or killed)."""
+    cutoff = timezone.now() - timedelta(seconds=settings.JOB_LEASE)
+    return Job.objects.filter(status=Job.RUNNING, locked_at__lt=cutoff).update(
+        status=Job.QUEUED, locked_by='', locked_at=None, last_error='Lease expired; re-queued.')
+
+
+def _renew(job, stopped):
+    try:
+        while not stopped.wait(settings.JOB_HEARTBEAT):
+            try:
+                Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by).update(
+                    locked_at=timezone.now())
+            except DatabaseError:
+                # e.g. SQLite busy behind the job's own write; the next beat tries again.
+                logger.warning("Could not renew the lease of job %s", job.pk, exc_info=True)
+    finally:
+        connection.close()  # this thread's connection
+
+
+@contextmanager
+def _heartbeat(job):
+    """Renew ``job``'s lease from a side thread until the block exits."""
+    stopped = threading.Event()
+    thread = threading.Thread(target=_renew, args=(job, stopped), name=f"job-{job.pk}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stopped.set()
+        thread.join()
+
+
+def _finish(job, **fields):
+    Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by).update(
+        locked_by='', locked_at=None, **fields)
+
+
+def run(job):
+    """Run one claimed job and record its outcome; returns True on success."""
+    handler = _registry.get(job.task)
+    attempts = job.attempts + 1
+    # Start the lease now; jobs later in a claimed batch have been waiting their turn.
+    started = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by).update(
+        locked_at=timezone.now())
+    if not started:
+        # Its lease ran out while it waited, and it was re-queued (maybe claimed by another worker).
+        logger.info("Job %s (%s) was re-queued before it started; skipping", job.pk, job.task)
+        return False
+    try:
+        if handler is None:
+            raise LookupError(f"No handler registered for {job.task!r}")
+        with _heartbeat(job):
+            result = handler(job.payload)
+    except Exception:  # noqa: BLE001 - the job records the failure
+        error = traceback.format_exc(limit=20)
+        logger.warning("Job %s (%s) failed on attempt %s", job.pk, job.task, attempts, exc_info=True)
+        if handler is not None and attempts < job.max_attempts:
+            delay = settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1)
+            _finish(job, status=Job.QUEUED, attempts=attempts, last_error=error,
+                    run_at=timezone.now() + timedelta(seconds=delay))
+        else:
+            _finish(job, status=Job.FAILED, attempts=attempts, last_error=error, finished_at=timezone.now())
+        return False
+    _finish(job, status=Job.DONE, attempts=attempts, result=result, finished_at=timezone.now())
+    return True
+
+
+def work(worker, batch_size=1):
+    """Claim and run one batch; returns the number of jobs processed."""
+    close_old_connections()
+    jobs = claim(worker, batch_size)
+    for job in jobs:
+        run(job)
+    return len(jobs)
+
+
+def retry(job_id):
+    """Send a failed job back to the queue with a fresh attempt budget."""
+    return Job.objects.filter(pk=job_id, status=Job.FAILED).update(
+        status=Job.QUEUED, attempts=0, run_at=timezone.now(), finished_at=None)
+
+
+def status_counts():
+    counts = dict(Job.objects.order_by().values_list('status').annotate(n=Count('id')))
+    return {status: counts.get(status, 0) for status, _ in Job.STATUSES}
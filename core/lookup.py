@@ -0,0 +1,131 @@
+"""Recipient lookup: username -> (account id, user id), plus prefix search.
+
+Exact lookups go through the shared cache (``RECIPIENT_CACHE_TTL``), so a
+transfer resolves its recipient without touching ``auth_user``. Prefix
+search on PostgreSQL uses the ``varchar_pattern_ops`` index Django already
+builds for the unique ``username`` column (``auth_user_username_*_like``); other
+backends (SQLite's LIKE is case-insensitive and cannot use the index) search
+an in-process sorted list of usernames, rebuilt every ``RECIPIENT_INDEX_TTL``
+seconds or when a user is added, renamed or deleted in this process.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .models import Account
+
+MISSING = 0  # cached marker for "no such user", so misses are cached too
+
+
+def _cache():
+    return caches[settings.RECIPIENT_CACHE_ALIAS]
+
+
+def _key(username):
+    return f"recipient:{username}"
+
+
+def resolve(username):
+    """``(account_id, user_id)`` for an exact username, or None."""
+    username = (username or '').strip()
+    if not username:
+        return None
+    cache = _cache()
+    hit = cache.get(_key(username))
+    if hit is None:
+        row = Account.objects.filter(user__username=username).values_list('id', 'user_id').first()
+        hit = tuple(row) if row else MISSING
+        cache.set(_key(username), hit, timeout=settings.RECIPIENT_CACHE_TTL)
+    return hit or None
+
+
+def recipient(username):
+    """An ``Account`` carrying just ``id`` and ``user_id`` (enough for the ledger), or None."""
+    found = resolve(username)
+    if found is None:
+        return None
+    account_id, user_id = found
+    return Account(id=account_id, user_id=user_id)
+
+
+class _SortedIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._names, self._ids = [], []
+        self._built = None
+
+    def stale(self):
+        self._built = None
+
+    def _refresh(self):
+        if self._built is not None and time.monotonic() - self._built < settings.RECIPIENT_INDEX_TTL:
+            return
+        with self._lock:
+            if self._built is not None and time.monotonic() - self._built < settings.RECIPIENT_INDEX_TTL:
+                return
+            rows = sorted(Account.objects.values_list('user__username', 'id'))
+            self._names = [name for name, _ in rows]
+            self._ids = [account_id for _, account_id in rows]
+            self._built = time.monotonic()
+
+    def search(self, prefix, limit):
+        self._refresh()
+        names, ids = self._names, self._ids
+        i = bisect_left(names, prefix)
+        out = []
+        while i < len(names) and len(out) < limit and names[i].startswith(prefix):
+            out.append((names[i], ids[i]))
+            i += 1
+        return out
+
+
+_index = _SortedIndex()
+
+
+def search(prefix, limit=10):
+    """Up to ``limit`` ``(username, account_id)`` pairs whose username starts with ``prefix``."""
+    prefix = (prefix or '').strip()
+    if not prefix:
+        return []
+    if connection.vendor == 'postgresql':
+        rows = (Account.objects.filter(user__username__startswith=prefix)
+                .order_by('user__username').values_list('user__username', 'id')[:limit])
+        return list(rows)
+    return _index.search(prefix, limit)
+
+
+def forget(*usernames):
+    cache = _cache()
+    cache.delete_many([_key(u) for u in usernames if u])
+    _index.stale()
+
+
+def _touches_username(raw, update_fields):
+    return not raw and (update_fields is None or 'username' in update_fields)
+
+
+@receiver(pre_save, sender=User)
+def _remember_old_username(sender, instance, raw=False, update_fields=None, **kwargs):
+    if instance.pk and _touches_username(raw, update_fields):
+        instance._old_username = User.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+
+
+@receiver(post_save, sender=User)
+def _user_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Logins save last_login only; skip those. New names may have a cached miss,
+    # and a rename leaves the old name pointing at this account.
+    if _touches_username(raw, update_fields):
+        names = (instance.username, getattr(instance, '_old_username', None))
+        transaction.on_commit(lambda: forget(*names))
+
+
+@receiver(post_delete, sender=User)
+def _user_deleted(sender, instance, **kwargs):
+    transaction.on_commit(lambda: forget(instance.username))
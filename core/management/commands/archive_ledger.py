@@ -0,0 +1,48 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import archive, statements
+
+
+class Command(BaseCommand):
+    help = (
+        "Move transactions, profit records and ledger entries older than the retention window "
+        "into the archive tables, a month at a time. Balances are checkpointed first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--before', help="YYYY-MM: archive months before this one "
+                                             "(default: ARCHIVE_RETENTION_DAYS back, rounded to a month start)")
+        parser.add_argument('--batch-size', type=int, default=settings.ARCHIVE_BATCH_SIZE,
+                            help="Transactions moved per database transaction")
+        parser.add_argument('--export', action='store_true',
+                            help="Also write each archived month to storage as gzipped CSV with a manifest")
+
+    def handle(self, *args, **opts):
+        if opts['before']:
+            try:
+                before, _ = statements.month_bounds(opts['before'])
+            except ValueError as e:
+                raise CommandError(str(e))
+        else:
+            before = archive.cutoff()
+        if before > archive.cutoff(0):
+            raise CommandError("--before cannot be later than the current month.")
+
+        def progress(record):
+            self.stderr.write(f"{record.month:%Y-%m}: {record.transactions} transactions moved")
+
+        started = time.monotonic()
+        months = 0
+        for record in archive.archive(before, batch_size=opts['batch_size'], export=opts['export'],
+                                      progress=progress if opts['verbosity'] > 1 else None):
+            months += 1
+            line = (f"{record.month:%Y-%m}: {record.transactions} transactions, {record.profit_records} profit "
+                    f"records, {record.ledger_entries} ledger entries")
+            if record.export_path:
+                line += f"; manifest {record.export_path}"
+            self.stdout.write(line)
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {months} month(s) before {before:%Y-%m} in {time.monotonic() - started:.1f}s."))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core import rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuild the daily ledger and per-account rollups from Transaction history."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='start', help="First day to rebuild (YYYY-MM-DD)")
+        parser.add_argument('--to', dest='end', help="Last day to rebuild (YYYY-MM-DD)")
+
+    def handle(self, *args, **opts):
+        start = self._day(opts['start'])
+        end = self._day(opts['end'])
+        days = 0
+        for day in rollups.backfill(start, end):
+            days += 1
+            if opts['verbosity'] > 1:
+                self.stdout.write(f"rebuilt {day}")
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt rollups for {days} day(s)."))
+
+    def _day(self, value):
+        if not value:
+            return None
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"Invalid date: {value!r} (expected YYYY-MM-DD).")
+        return day
@@ -0,0 +1,242 @@
+import json
+import random
+import statistics
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection, connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core import ledger, rollups
+from core.models import Account, LedgerEntry, MoneyRequest, ProfitRecord, Transaction, WithdrawalRequest
+
+WORKLOADS = (
+    'transfer', 'approve_request', 'withdraw_approve',
+    'view_transactions', 'view_dashboard', 'view_admin_dashboard', 'view_profit_report',
+)
+
+
+def summarise(samples, errors, wall, queries=None):
+    """Throughput and latency percentiles for a list of per-op durations in seconds."""
+    ms = sorted(s * 1000 for s in samples)
+    pct = statistics.quantiles(ms, n=100, method='inclusive') if len(ms) > 1 else ms * 99
+    summary = {
+        'ops': len(samples),
+        'errors': len(errors),
+        'error_samples': errors[:5],
+        'wall_seconds': round(wall, 3),
+        'ops_per_sec': round(len(samples) / wall, 1) if wall else None,
+        'p50_ms': round(pct[49], 2) if ms else None,
+        'p95_ms': round(pct[94], 2) if ms else None,
+        'p99_ms': round(pct[98], 2) if ms else None,
+    }
+    if queries is not None:
+        summary['queries_per_op'] = round(statistics.mean(queries), 2) if queries else None
+        summary['max_queries'] = max(queries) if queries else None
+    return summary
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a throwaway database and benchmark the money paths and main views. "
+        "Runs against a fresh test database (never your real data) and reports "
+        "ops/sec, latency percentiles, queries per op and balance conservation."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--transactions', type=int, default=10000, help="Historical transactions to seed")
+        parser.add_argument('--ops', type=int, default=500, help="Operations per workload")
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--workload', action='append', choices=WORKLOADS,
+                            help="Run only these workloads (repeatable); default all")
+        parser.add_argument('--output', help="Write the JSON report to this file")
+        parser.add_argument('--keepdb', action='store_true', help="Keep the benchmark database afterwards")
+
+    def handle(self, *args, **opts):
+        db = settings.DATABASES['default']
+        if db['ENGINE'].endswith('sqlite3') and not db.get('TEST', {}).get('NAME'):
+            # In-memory SQLite can't be shared across worker threads; use a file.
+            db.setdefault('TEST', {})['NAME'] = str(settings.BASE_DIR / 'bench.sqlite3')
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=opts['keepdb'])
+        try:
+            report = self._run(opts)
+        finally:
+            connections.close_all()
+            if not opts['keepdb']:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        text = json.dumps(report, indent=2, default=str)
+        if opts['output']:
+            with open(opts['output'], 'w') as f:
+                f.write(text)
+        self.stdout.write(text)
+        if not report['conservation']['ok']:
+            raise CommandError("Balance conservation check failed.")
+
+    def _run(self, opts):
+        started = time.perf_counter()
+        self.accounts = self._seed(opts['users'], opts['transactions'])
+        self.admin = User.objects.create_superuser('bench_admin', password=None)
+        seed_seconds = time.perf_counter() - started
+        self.stderr.write(f"Seeded {opts['users']} users / {opts['transactions']} transactions in {seed_seconds:.1f}s")
+
+        results = {}
+        for name in opts['workload'] or WORKLOADS:
+            results[name] = self._drive(name, opts['ops'], opts['concurrency'])
+            self.stderr.write(f"{name}: {results[name]['ops_per_sec']} ops/s, p95 {results[name]['p95_ms']} ms")
+
+        return {
+            'commit': self._commit(),
+            'vendor': connection.vendor,
+            'created_at': timezone.now().isoformat(),
+            'params': {k: opts[k] for k in ('users', 'transactions', 'ops', 'concurrency')},
+            'seed_seconds': round(seed_seconds, 3),
+            'workloads': results,
+            'conservation': self._conservation(),
+        }
+
+    def _seed(self, n_users, n_transactions):
+        password = make_password('bench')  # hash once; PBKDF2 per user would dominate seeding
+        users = User.objects.bulk_create(
+            [User(username=f'bench{i}', password=password) for i in range(n_users)], batch_size=1000)
+        opening = Decimal('100000.00')
+        accounts = Account.objects.bulk_create(
+            [Account(user=u, balance=opening) for u in users], batch_size=1000)
+        start = timezone.now() - timedelta(days=90)
+        txs = [Transaction(to_account=acc, amount=opening, fee=0, type=Transaction.DEPOSIT,
+                           created_at=start, note='bench opening') for acc in accounts]
+        balances = {acc.id: opening for acc in accounts}
+        step = timedelta(days=90) / max(n_transactions, 1)
+        for i in range(n_transactions):
+            src, dst = random.sample(accounts, 2)
+            amount = Decimal(random.randint(100, 5000)) / 100
+            if balances[src.id] < amount:
+                continue
+            balances[src.id] -= amount
+            balances[dst.id] += amount
+            txs.append(Transaction(from_account=src, to_account=dst, amount=amount, fee=0,
+                                   type=Transaction.TRANSFER, created_at=start + step * i))
+        txs = Transaction.objects.bulk_create(txs, batch_size=2000)
+        ProfitRecord.objects.bulk_create(
+            [ProfitRecord(transaction=tx, amount=0, created_at=tx.created_at) for tx in txs], batch_size=2000)
+        LedgerEntry.objects.bulk_create([e for tx in txs for e in ledger.entries_for(tx)], batch_size=2000)
+        for acc in accounts:
+            acc.balance = balances[acc.id]
+        Account.objects.bulk_update(accounts, ['balance'], batch_size=1000)
+        for _ in rollups.backfill():
+            pass
+        rollups.reset_totals(rollups.recompute_totals())
+        return accounts
+
+    # -- workloads -------------------------------------------------------
+
+    def _op_transfer(self, client):
+        src, dst = random.sample(self.accounts, 2)
+        ledger.transfer(src, dst, Decimal('1.00'), note='bench')
+
+    def _op_approve_request(self, client):
+        src, dst = random.sample(self.accounts, 2)
+        req = MoneyRequest.objects.create(requester=dst, target=src, amount=Decimal('1.00'))
+        ledger.approve_money_request(req)
+
+    def _op_withdraw_approve(self, client):
+        acc = random.choice(self.accounts)
+        wr = WithdrawalRequest.objects.create(user_id=acc.user_id, amount=Decimal('1.00'))
+        ledger.approve_withdrawal(wr)
+
+    def _view(self, client, url, as_admin=False):
+        if not getattr(client, 'bench_logged_in', False):
+            client.force_login(self.admin if as_admin else random.choice(self.accounts).user)
+            client.bench_logged_in = True
+        response = client.get(url)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        if response.status_code != 200:
+            raise RuntimeError(f"GET {url} returned {response.status_code}")
+
+    def _op_view_transactions(self, client):
+        self._view(client, '/u/transactions/')
+
+    def _op_view_dashboard(self, client):
+        self._view(client, '/u/dashboard/')
+
+    def _op_view_admin_dashboard(self, client):
+        self._view(client, '/u/admin-dashboard/', as_admin=True)
+
+    def _op_view_profit_report(self, client):
+        day = (timezone.localdate() - timedelta(days=random.randint(1, 89))).isoformat()
+        self._view(client, f'/u/profit-report.csv?from={day}&to={day}', as_admin=True)
+
+    def _drive(self, name, ops, concurrency):
+        op = getattr(self, f'_op_{name}')
+        local = threading.local()
+        samples, queries, errors = [], [], []
+        lock = threading.Lock()
+
+        def run_one(_):
+            if not hasattr(local, 'client'):
+                local.client = Client()
+            t0 = time.perf_counter()
+            try:
+                with CaptureQueriesContext(connection) as ctx:
+                    op(local.client)
+            except Exception as e:  # noqa: BLE001 - recorded in the report
+                with lock:
+                    errors.append(repr(e))
+                return
+            elapsed = time.perf_counter() - t0
+            with lock:
+                samples.append(elapsed)
+                queries.append(len(ctx))
+
+        def run_batch(indexes):
+            try:
+                for i in indexes:
+                    run_one(i)
+            finally:
+                close_old_connections()
+                connection.close()
+
+        t0 = time.perf_counter()
+        if concurrency == 1:
+            # Inline, on this thread's connection (what the benchmark tests rely on).
+            for i in range(ops):
+                run_one(i)
+        else:
+            with ThreadPoolExecutor(max_workers=concurrency) as pool:
+                list(pool.map(run_batch, [range(i, ops, concurrency) for i in range(concurrency)]))
+        wall = time.perf_counter() - t0
+        return summarise(samples, errors, wall, queries)
+
+    def _conservation(self):
+        expected = rollups.recompute_totals()
+        running = rollups.system_totals()
+        drift = {f: str(running[f] - expected[f]) for f in rollups.TOTALS_FIELDS if running[f] != expected[f]}
+        negative = Account.objects.filter(balance__lt=0).count()
+        return {
+            'balances': str(expected['balances']),
+            'expected_outstanding': str(expected['outstanding']),
+            'totals_drift': drift,
+            'negative_balances': negative,
+            'ok': expected['balances'] == expected['outstanding'] and not drift and not negative,
+        }
+
+    def _commit(self):
+        try:
+            return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                  cwd=settings.BASE_DIR, check=True).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
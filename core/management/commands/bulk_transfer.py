@@ -0,0 +1,52 @@
+import csv
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core import ledger
+from core.models import Account
+from core.utils import parse_transfer_rows
+
+
+class Command(BaseCommand):
+    help = "Pay many users from one account using a CSV or JSON list of to_username, amount, note."
+
+    def add_arguments(self, parser):
+        parser.add_argument('sender', help="Username of the paying account")
+        parser.add_argument('path', help="CSV/JSON file to read, or '-' for stdin")
+        parser.add_argument('--chunk-size', type=int, default=None)
+        parser.add_argument('--report', help="Write the per-row report as CSV to this file")
+
+    def handle(self, *args, **opts):
+        try:
+            sender = Account.objects.get(user__username=opts['sender'])
+        except Account.DoesNotExist:
+            raise CommandError(f"No account for user {opts['sender']!r}.")
+
+        if opts['path'] == '-':
+            data = sys.stdin.read()
+        else:
+            with open(opts['path'], encoding='utf-8-sig') as f:
+                data = f.read()
+        try:
+            rows = parse_transfer_rows(data)
+        except ValueError as e:
+            raise CommandError(f"Could not parse rows: {e}")
+
+        results = ledger.bulk_transfer(sender, rows, chunk_size=opts['chunk_size'])
+
+        if opts['report']:
+            with open(opts['report'], 'w', newline='') as f:
+                self._write_report(f, results)
+        else:
+            self._write_report(self.stdout, results)
+
+        ok = sum(1 for r in results if r['ok'])
+        self.stderr.write(f"{ok} of {len(results)} transfers completed; balance now Rs.{sender.balance}.")
+
+    def _write_report(self, out, results):
+        writer = csv.writer(out)
+        writer.writerow(['row', 'to_username', 'amount', 'fee', 'status', 'transaction_id', 'error'])
+        for r in results:
+            writer.writerow([r['row'], r['to_username'], r['amount'], r['fee'],
+                             'ok' if r['ok'] else 'failed', r['transaction_id'] or '', r['error']])
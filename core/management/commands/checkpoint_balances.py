@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from core import ledger
+from core.models import BalanceCheckpoint, LedgerEntry
+
+
+class Command(BaseCommand):
+    help = "Write balance checkpoints so derived balance reads only replay recent ledger entries."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-entries', type=int, default=1,
+                            help="Only checkpoint books with at least this many entries since their last checkpoint")
+
+    def handle(self, *args, **opts):
+        written = 0
+        for account_id in LedgerEntry.objects.filter(book=LedgerEntry.ACCOUNT).values_list(
+                'account_id', flat=True).distinct().order_by('account_id').iterator():
+            if self._due(account_id, LedgerEntry.ACCOUNT, opts['min_entries']):
+                written += ledger.checkpoint(account_id) is not None
+        for book in (LedgerEntry.HOUSE, LedgerEntry.CASH):
+            if self._due(None, book, opts['min_entries']):
+                written += ledger.checkpoint(book=book) is not None
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} checkpoint(s)."))
+
+    def _due(self, account_id, book, min_entries):
+        latest = BalanceCheckpoint.objects.filter(book=book, account_id=account_id).order_by('-entry_id').values_list(
+            'entry_id', flat=True).first()
+        entries = LedgerEntry.objects.filter(book=book, account_id=account_id)
+        if latest is not None:
+            entries = entries.filter(id__gt=latest)
+        return entries[:min_entries].count() >= min_entries
@@ -0,0 +1,79 @@
+import re
+
+from django.core.management.base import BaseCommand
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from core.models import Account, MoneyRequest, ProfitRecord, Transaction, WithdrawalRequest
+
+# A plan line that reads a whole table rather than seeking an index.
+FULL_SCAN = {
+    'sqlite': re.compile(r'\bSCAN (\w+)\b(?! USING (?:COVERING )?INDEX)(?! USING INTEGER PRIMARY KEY)'),
+    'postgresql': re.compile(r'Seq Scan on (\w+)'),
+}
+
+
+def hot_queries(account):
+    """The admin queues, dashboards and report queries the indexes are built for."""
+    now = timezone.now()
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return {
+        'admin withdrawal queue': WithdrawalRequest.objects.pending().with_user().order_by('-created_at'),
+        'user pending withdrawals': WithdrawalRequest.objects.pending().filter(user_id=account.user_id)
+                                                                       .order_by('-created_at'),
+        'processed withdrawals': WithdrawalRequest.objects.filter(status=WithdrawalRequest.APPROVED)
+                                                          .order_by('-created_at')[:200],
+        'pending money requests': MoneyRequest.objects.pending().order_by('-created_at'),
+        'incoming requests': MoneyRequest.objects.filter(target=account).order_by('-created_at'),
+        'outgoing requests': MoneyRequest.objects.filter(requester=account).order_by('-created_at'),
+        'dashboard recent': Transaction.objects.for_account(account).filter(created_at__gte=day_start)
+                                               .order_by('-created_at')[:10],
+        'admin recent transactions': Transaction.objects.order_by('-created_at')[:200],
+        'transactions by day': Transaction.objects.filter(created_at__gte=day_start, created_at__lt=now),
+        'profit report range': ProfitRecord.objects.filter(created_at__gte=day_start, created_at__lt=now)
+                                                   .order_by('created_at', 'id'),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "EXPLAIN the admin queues, dashboards and report queries and fail if any of them "
+        "falls back to a full table scan. Run after changing indexes or query shapes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--verbose-plans', action='store_true', help="Print every plan, not just failures")
+
+    def handle(self, *args, **opts):
+        account = Account.objects.order_by('id').first() or Account(id=0, user_id=0)
+        failures = 0
+        for name, qs in hot_queries(account).items():
+            alias = router.db_for_read(qs.model)
+            vendor = connections[alias].vendor
+            pattern = FULL_SCAN.get(vendor)
+            if pattern is None:
+                self.stdout.write(self.style.WARNING(f"{vendor}: no scan check, skipping {name}"))
+                continue
+            plan = self._explain(qs.using(alias), alias, vendor)
+            scans = sorted(set(pattern.findall(plan)))
+            if scans:
+                failures += 1
+                self.stdout.write(self.style.ERROR(f"{name}: full scan of {', '.join(scans)}"))
+                self.stdout.write(plan)
+            else:
+                self.stdout.write(f"{name}: ok")
+                if opts['verbose_plans']:
+                    self.stdout.write(plan)
+
+        if failures:
+            self.stdout.write(self.style.ERROR(f"{failures} query plan(s) use a full scan."))
+            raise SystemExit(1)
+        self.stdout.write(self.style.SUCCESS("All hot queries use indexes."))
+
+    def _explain(self, qs, alias, vendor):
+        with transaction.atomic(using=alias):
+            if vendor == 'postgresql':
+                # Small tables make a seq scan the cheapest plan; ask whether an index *can* serve it.
+                with connections[alias].cursor() as cursor:
+                    cursor.execute('SET LOCAL enable_seqscan = off')
+            return qs.explain()
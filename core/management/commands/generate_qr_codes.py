@@ -0,0 +1,43 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.models import Account
+from core.utils import pay_path, qr_filename, render_qr_png, store_qr_png
+
+
+class Command(BaseCommand):
+    help = "Pre-render pay QR codes for every account that lacks a current one, across a process pool."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--force', action='store_true', help="Also process accounts whose stored name is current (restores missing files)")
+
+    def handle(self, *args, **opts):
+        done = 0
+        with ProcessPoolExecutor(max_workers=opts['workers']) as pool:
+            for batch in self._stale_batches(opts['batch_size'], opts['force']):
+                urls = [url for _, url in batch]
+                pngs = pool.map(render_qr_png, urls, chunksize=max(1, len(urls) // (opts['workers'] * 4)))
+                accounts = [Account(id=account_id, qr_image=store_qr_png(url, png))
+                            for (account_id, url), png in zip(batch, pngs)]
+                Account.objects.bulk_update(accounts, ['qr_image'])
+                done += len(accounts)
+                self.stdout.write(f"{done} QR codes generated")
+        self.stdout.write(self.style.SUCCESS(f"Done: {done} QR codes generated."))
+
+    def _stale_batches(self, batch_size, force):
+        batch = []
+        for account_id, current in Account.objects.order_by('id').values_list('id', 'qr_image').iterator(chunk_size=batch_size):
+            url = f"{settings.QR_BASE_URL}{pay_path(account_id)}"
+            if not force and current == qr_filename(url):
+                continue
+            batch.append((account_id, url))
+            if len(batch) == batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
@@ -0,0 +1,81 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode, urljoin
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+from django.core.management.base import BaseCommand, CommandError
+
+from .bench import summarise
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive concurrent GETs against a running server, e.g. to compare "
+        "'gunicorn friendsbank.wsgi' sync workers with 'uvicorn friendsbank.asgi:application'."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000')
+        parser.add_argument('--path', action='append', help="Path to request (repeatable); default dashboard")
+        parser.add_argument('--username', required=True)
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=50)
+        parser.add_argument('--label', default='', help="Free-form tag stored in the report, e.g. 'uvicorn -w4'")
+        parser.add_argument('--output', help="Write the JSON report to this file")
+
+    def handle(self, *args, **opts):
+        base = opts['base_url']
+        paths = opts['path'] or ['/u/dashboard/']
+        cookie = self._login(base, opts['username'], opts['password'])
+        report = {'label': opts['label'], 'base_url': base, 'concurrency': opts['concurrency'], 'paths': {}}
+        for path in paths:
+            report['paths'][path] = self._drive(urljoin(base, path), cookie, opts['requests'], opts['concurrency'])
+            self.stderr.write(f"{path}: {report['paths'][path]['ops_per_sec']} req/s, p95 {report['paths'][path]['p95_ms']} ms")
+        text = json.dumps(report, indent=2)
+        if opts['output']:
+            with open(opts['output'], 'w') as f:
+                f.write(text)
+        self.stdout.write(text)
+
+    def _login(self, base, username, password):
+        jar = CookieJar()
+        opener = build_opener(HTTPCookieProcessor(jar))
+        login_url = urljoin(base, '/login/')
+        try:
+            opener.open(login_url).read()
+            csrf = next(c.value for c in jar if c.name == 'csrftoken')
+            data = urlencode({'username': username, 'password': password, 'csrfmiddlewaretoken': csrf}).encode()
+            opener.open(Request(login_url, data=data, headers={'Referer': login_url})).read()
+        except (URLError, StopIteration) as e:
+            raise CommandError(f"Could not log in at {login_url}: {e}")
+        cookies = {c.name: c.value for c in jar}
+        if 'sessionid' not in cookies:
+            raise CommandError("Login failed: no session cookie returned.")
+        return '; '.join(f"{k}={v}" for k, v in cookies.items())
+
+    def _drive(self, url, cookie, total, concurrency):
+        opener = build_opener()
+        samples, errors = [], []
+        lock = threading.Lock()
+
+        def one(_):
+            t0 = time.perf_counter()
+            try:
+                with opener.open(Request(url, headers={'Cookie': cookie})) as response:
+                    response.read()
+            except (HTTPError, URLError, OSError) as e:
+                with lock:
+                    errors.append(repr(e))
+                return
+            with lock:
+                samples.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(one, range(total)))
+        return summarise(samples, errors, time.perf_counter() - t0)
@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+
+class Command(BaseCommand):
+    help = "Delete expired rows from the session table in batches (run from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **opts):
+        if settings.SESSION_ENGINE.endswith(('.signed_cookies', '.cache')):
+            self.stdout.write(f"{settings.SESSION_ENGINE} keeps no session rows; nothing to do.")
+            return
+        now = timezone.now()
+        deleted = 0
+        while True:
+            keys = list(Session.objects.filter(expire_date__lt=now)
+                        .values_list('session_key', flat=True)[:opts['batch_size']])
+            if not keys:
+                break
+            deleted += Session.objects.filter(session_key__in=keys).delete()[0]
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired session(s)."))
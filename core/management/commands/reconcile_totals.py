@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from core import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute system totals from Transaction rows and report drift against the running totals."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help="Overwrite the running totals with the recomputed ones")
+
+    def handle(self, *args, **opts):
+        running = rollups.system_totals()
+        expected = rollups.recompute_totals()
+        drift = False
+        for field in rollups.TOTALS_FIELDS:
+            delta = running[field] - expected[field]
+            line = f"{field:<12} running={running[field]:>14} expected={expected[field]:>14} drift={delta}"
+            if delta:
+                drift = True
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+
+        balance_delta = expected['balances'] - expected['outstanding']
+        line = f"{'balances':<12} accounts={expected['balances']:>13} expected={expected['outstanding']:>14} drift={balance_delta}"
+        if balance_delta:
+            drift = True
+            self.stdout.write(self.style.ERROR(line))
+        else:
+            self.stdout.write(line)
+
+        if opts['fix']:
+            rollups.reset_totals(expected)
+            self.stdout.write(self.style.SUCCESS("Running totals reset from transactions."))
+        elif drift:
+            self.stdout.write(self.style.WARNING("Drift detected; re-run with --fix to reset the running totals."))
+            raise SystemExit(1)
+        else:
+            self.stdout.write(self.style.SUCCESS("No drift."))
@@ -0,0 +1,77 @@
+import multiprocessing
+import os
+import signal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core import jobs
+
+# Fork keeps the configured Django (settings, app registry, task registry) in each worker.
+_context = multiprocessing.get_context('fork')
+
+
+def _worker_loop(index, batch_size, poll_interval, once, stop):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the parent coordinates shutdown
+    worker = f"{jobs.worker_id()}/{index}"
+    try:
+        while not stop.is_set():
+            if index == 0:
+                jobs.requeue_stale()
+            if jobs.work(worker, batch_size):
+                continue
+            if once:
+                break
+            stop.wait(poll_interval)
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Run background job workers: a pool of processes that claim queued jobs "
+        "with SELECT ... FOR UPDATE SKIP LOCKED and run them, retrying failures."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=1, help="Jobs claimed per query")
+        parser.add_argument('--poll-interval', type=float, default=settings.JOB_POLL_INTERVAL)
+        parser.add_argument('--once', action='store_true', help="Exit once the queue is drained")
+
+    def handle(self, *args, **opts):
+        self.stdout.write(f"Tasks: {', '.join(jobs.registered())}")
+        if opts['processes'] <= 1:
+            stop = _context.Event()
+            signal.signal(signal.SIGTERM, lambda *_: stop.set())
+            try:
+                _worker_loop(0, opts['batch_size'], opts['poll_interval'], opts['once'], stop)
+            except KeyboardInterrupt:
+                pass
+            self.stdout.write(self.style.SUCCESS(f"Worker stopped. Queue: {jobs.status_counts()}"))
+            return
+
+        # Children must not inherit the parent's open database connections.
+        connections.close_all()
+        stop = _context.Event()
+        procs = [
+            _context.Process(target=_worker_loop, name=f"job-worker-{i}",
+                             args=(i, opts['batch_size'], opts['poll_interval'], opts['once'], stop))
+            for i in range(opts['processes'])
+        ]
+        for proc in procs:
+            proc.start()
+        self.stdout.write(f"Started {len(procs)} workers.")
+
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        try:
+            while any(proc.is_alive() for proc in procs):
+                for proc in procs:
+                    proc.join(timeout=0.5)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping workers after their current job...")
+            stop.set()
+        for proc in procs:
+            proc.join()
+        self.stdout.write(self.style.SUCCESS(f"Workers stopped. Queue: {jobs.status_counts()}"))
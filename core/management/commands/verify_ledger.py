@@ -0,0 +1,111 @@
+import heapq
+from collections import defaultdict
+from decimal import Decimal
+from itertools import chain
+
+from django.core.management.base import BaseCommand
+
+from core.models import (
+    Account, ArchivedLedgerEntry, ArchivedTransaction, BalanceCheckpoint, LedgerEntry, Transaction,
+)
+
+ZERO = Decimal('0.00')
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay the double-entry ledger (archived entries included) in streaming fashion: every posting must balance, "
+        "every checkpoint must match the replay, and every Account.balance must match its entries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--max-report', type=int, default=20, help="Problems to print per check")
+
+    def handle(self, *args, **opts):
+        self.chunk = opts['chunk_size']
+        self.max_report = opts['max_report']
+        problems = 0
+        problems += self._check_postings()
+        balances, book_totals, checkpoint_problems = self._replay()
+        problems += checkpoint_problems
+        problems += self._check_accounts(balances)
+
+        for book, total in sorted(book_totals.items()):
+            self.stdout.write(f"{book:<8} balance Rs.{total}")
+        if problems:
+            self.stdout.write(self.style.ERROR(f"{problems} problem(s) found."))
+            raise SystemExit(1)
+        self.stdout.write(self.style.SUCCESS("Ledger verified."))
+
+    def _report(self, count, message):
+        if count <= self.max_report:
+            self.stdout.write(self.style.ERROR(message))
+
+    def _check_postings(self):
+        """Each transaction's legs must sum to zero; every transaction must have legs."""
+        problems = 0
+        current, total = None, ZERO
+        # A transaction's legs are archived together, so each table holds whole postings.
+        rows = chain.from_iterable(
+            model.objects.order_by('transaction_id', 'id').values_list('transaction_id', 'amount')
+            .iterator(chunk_size=self.chunk)
+            for model in (ArchivedLedgerEntry, LedgerEntry))
+        for tx_id, amount in rows:
+            if tx_id != current:
+                if current is not None and total:
+                    problems += 1
+                    self._report(problems, f"transaction {current}: legs sum to {total}")
+                current, total = tx_id, ZERO
+            total += amount
+        if current is not None and total:
+            problems += 1
+            self._report(problems, f"transaction {current}: legs sum to {total}")
+
+        unposted = sum(model.objects.filter(entries__isnull=True).count()
+                       for model in (ArchivedTransaction, Transaction))
+        if unposted:
+            problems += unposted
+            self.stdout.write(self.style.ERROR(f"{unposted} transaction(s) have no ledger entries"))
+        return problems
+
+    def _replay(self):
+        """Walk entries in id order, checking each checkpoint as the replay passes it."""
+        checkpoints = list(BalanceCheckpoint.objects.order_by('entry_id').values_list(
+            'entry_id', 'book', 'account_id', 'balance'))
+        balances = defaultdict(lambda: ZERO)
+        problems, next_cp = 0, 0
+
+        def check_until(entry_id):
+            nonlocal problems, next_cp
+            while next_cp < len(checkpoints) and checkpoints[next_cp][0] < entry_id:
+                cp_entry, book, account_id, expected = checkpoints[next_cp]
+                actual = balances[(book, account_id)]
+                if actual != expected:
+                    problems += 1
+                    self._report(problems, f"checkpoint {book}:{account_id} @ {cp_entry}: "
+                                           f"stored Rs.{expected}, replay Rs.{actual}")
+                next_cp += 1
+
+        rows = heapq.merge(*(
+            model.objects.order_by('id').values_list('id', 'book', 'account_id', 'amount')
+            .iterator(chunk_size=self.chunk)
+            for model in (ArchivedLedgerEntry, LedgerEntry)))
+        for entry_id, book, account_id, amount in rows:
+            check_until(entry_id)
+            balances[(book, account_id)] += amount
+        check_until(float('inf'))
+
+        book_totals = defaultdict(lambda: ZERO)
+        for (book, _), amount in balances.items():
+            book_totals[book] += amount
+        return balances, book_totals, problems
+
+    def _check_accounts(self, balances):
+        problems = 0
+        for account_id, stored in Account.objects.order_by('id').values_list('id', 'balance').iterator(chunk_size=self.chunk):
+            derived = balances.get((LedgerEntry.ACCOUNT, account_id), ZERO)
+            if derived != stored:
+                problems += 1
+                self._report(problems, f"account {account_id}: Account.balance Rs.{stored}, entries Rs.{derived}")
+        return problems
@@ -0,0 +1,244 @@
+"""Request-level performance metrics, exposed in Prometheus text format.
+
+``MetricsMiddleware`` times every request and, through a database execute
+wrapper installed on each new connection, counts its queries and query
+time and remembers its slowest statement. Ledger operations are timed with
+``@timed``. Requests over the ``METRICS_SLOW_REQUEST_SECONDS`` or
+``METRICS_QUERY_BUDGET`` budgets are logged (sampled) to
+``core.metrics.slow``.
+
+Metrics live in process memory, like ``caching.stats()``: with several
+worker processes each one serves its own ``/metrics``.
+"""
+import logging
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils.crypto import constant_time_compare
+
+slow_log = logging.getLogger('core.metrics.slow')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    def __init__(self, name, help, buckets, labels):
+        self.name, self.help, self.buckets, self.labels = name, help, buckets, labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            counts, total = self._series.get(label_values, (None, 0.0))
+            if counts is None:
+                counts = [0] * (len(self.buckets) + 1)
+            counts[bisect_left(self.buckets, value)] += 1
+            self._series[label_values] = (counts, total + value)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: (list(c), t) for k, (c, t) in self._series.items()}
+        for label_values, (counts, total) in sorted(series.items()):
+            labels = _labels(self.labels, label_values)
+            cumulative = 0
+            for bound, count in zip(self.buckets, counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="{bound}"}} {cumulative}')
+            cumulative += counts[-1]
+            lines.append(f'{self.name}_bucket{{{labels}{"," if labels else ""}le="+Inf"}} {cumulative}')
+            lines.append(f'{self.name}_sum{{{labels}}} {total:.6f}')
+            lines.append(f'{self.name}_count{{{labels}}} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help, labels):
+        self.name, self.help, self.labels = name, help, labels
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, n=1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + n
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = dict(self._series)
+        for label_values, value in sorted(series.items()):
+            lines.append(f'{self.name}{{{_labels(self.labels, label_values)}}} {value}')
+        return lines
+
+
+def _labels(names, values):
+    escaped = (str(v).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n') for v in values)
+    return ','.join(f'{n}="{v}"' for n, v in zip(names, escaped))
+
+
+REQUEST_SECONDS = Histogram('friendsbank_request_duration_seconds', "Wall time per request.",
+                            LATENCY_BUCKETS, ('view', 'method', 'status'))
+REQUEST_QUERIES = Histogram('friendsbank_request_queries', "Database queries per request.",
+                            QUERY_BUCKETS, ('view',))
+REQUEST_DB_SECONDS = Histogram('friendsbank_request_db_seconds', "Database time per request.",
+                               LATENCY_BUCKETS, ('view',))
+LEDGER_SECONDS = Histogram('friendsbank_ledger_operation_seconds', "Ledger operation time, retries included.",
+                           LATENCY_BUCKETS, ('operation', 'outcome'))
+CACHE_REQUESTS = Counter('friendsbank_dashboard_cache_total', "Dashboard fragment cache lookups.", ('outcome',))
+SLOW_REQUESTS = Counter('friendsbank_slow_requests_total', "Requests over the latency or query budget.",
+                        ('view', 'reason'))
+METRICS = (REQUEST_SECONDS, REQUEST_QUERIES, REQUEST_DB_SECONDS, LEDGER_SECONDS, CACHE_REQUESTS, SLOW_REQUESTS)
+
+
+class RequestStats:
+    __slots__ = ('queries', 'db_seconds', 'slowest_sql', 'slowest_seconds', 'cache')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.slowest_sql = ''
+        self.slowest_seconds = 0.0
+        self.cache = {'hit': 0, 'miss': 0}
+
+
+_current = ContextVar('request_stats', default=None)
+
+
+def _db_wrapper(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    t0 = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - t0
+        stats.queries += 1
+        stats.db_seconds += elapsed
+        if elapsed > stats.slowest_seconds:
+            stats.slowest_seconds, stats.slowest_sql = elapsed, sql
+
+
+@receiver(connection_created)
+def _install_db_wrapper(sender, connection, **kwargs):
+    if _db_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_db_wrapper)
+
+
+def record_cache(outcome, n=1):
+    """Called by ``core.caching`` for every fragment lookup."""
+    if n:
+        CACHE_REQUESTS.inc(outcome, n=n)
+        stats = _current.get()
+        if stats is not None:
+            stats.cache[outcome] += n
+
+
+def timed(operation):
+    """Record the wall time of a (sync) ledger operation, labelled by outcome."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            t0 = time.perf_counter()
+            outcome = 'ok'
+            try:
+                return func(*args, **kwargs)
+            except Exception as exc:
+                outcome = type(exc).__name__
+                raise
+            finally:
+                LEDGER_SECONDS.observe(time.perf_counter() - t0, operation, outcome)
+        return wrapper
+    return decorator
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return '<unmatched>'
+    return match.url_name or match._func_path
+
+
+def _finish(request, response, stats, elapsed):
+    view = _view_name(request)
+    REQUEST_SECONDS.observe(elapsed, view, request.method, response.status_code)
+    REQUEST_QUERIES.observe(stats.queries, view)
+    REQUEST_DB_SECONDS.observe(stats.db_seconds, view)
+    response['Server-Timing'] = (f'db;dur={stats.db_seconds * 1000:.1f};desc="{stats.queries} queries", '
+                                 f'total;dur={elapsed * 1000:.1f}')
+
+    reasons = []
+    if elapsed > settings.METRICS_SLOW_REQUEST_SECONDS:
+        reasons.append('latency')
+    if stats.queries > settings.METRICS_QUERY_BUDGET:
+        reasons.append('queries')
+    for reason in reasons:
+        SLOW_REQUESTS.inc(view, reason)
+    if reasons and random.random() < settings.METRICS_SLOW_SAMPLE_RATE:
+        slow_log.warning(
+            "slow request %s %s view=%s status=%s time=%.1fms queries=%s db=%.1fms "
+            "cache=%s/%s slowest=%.1fms %s",
+            request.method, request.path, view, response.status_code, elapsed * 1000, stats.queries,
+            stats.db_seconds * 1000, stats.cache['hit'], stats.cache['hit'] + stats.cache['miss'],
+            stats.slowest_seconds * 1000, stats.slowest_sql[:500],
+        )
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        t0 = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        _finish(request, response, stats, time.perf_counter() - t0)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        t0 = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        _finish(request, response, stats, time.perf_counter() - t0)
+        return response
+
+
+def render():
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """Prometheus scrape endpoint; needs ``Authorization: Bearer METRICS_TOKEN`` or a superuser session."""
+    token = settings.METRICS_TOKEN
+    authorized = token and constant_time_compare(request.META.get('HTTP_AUTHORIZATION', ''), f'Bearer {token}')
+    if not authorized and not request.user.is_superuser:
+        return HttpResponseForbidden("Forbidden")
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
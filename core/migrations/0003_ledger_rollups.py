@@ -0,0 +1,44 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:15
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_transaction_history_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyLedgerStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('type', models.CharField(choices=[('transfer', 'Transfer'), ('deposit', 'Deposit'), ('withdraw', 'Withdraw')], max_length=10)),
+                ('shard', models.PositiveSmallIntegerField(default=0)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('volume', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('fees', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'type', 'shard'), name='daily_stats_day_type_shard_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='AccountDailyStats',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('credited', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('debited', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('fees', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_stats', to='core.account')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('account', 'day'), name='account_daily_stats_uniq')],
+            },
+        ),
+    ]
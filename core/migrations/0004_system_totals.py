@@ -0,0 +1,43 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:16
+
+from decimal import Decimal
+from django.db import migrations, models
+
+
+def seed_totals(apps, schema_editor):
+    Transaction = apps.get_model('core', 'Transaction')
+    SystemTotals = apps.get_model('core', 'SystemTotals')
+    sums = {row['type']: row for row in Transaction.objects.values('type').annotate(
+        amount=models.Sum('amount'), fee=models.Sum('fee')).order_by()}
+    zero = {'amount': Decimal('0'), 'fee': Decimal('0')}
+    deposit, transfer, withdraw = (sums.get(t, zero) for t in ('deposit', 'transfer', 'withdraw'))
+    cents = Decimal('0.01')
+    deposits = Decimal(deposit['amount'] or 0).quantize(cents)
+    withdrawals = Decimal(withdraw['amount'] or 0).quantize(cents)
+    fees = sum(Decimal(row['fee'] or 0).quantize(cents) for row in (deposit, transfer, withdraw))
+    SystemTotals.objects.create(
+        shard=0, deposits=deposits, withdrawals=withdrawals, fees=fees,
+        outstanding=deposits - withdrawals - fees,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_ledger_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SystemTotals',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('shard', models.PositiveSmallIntegerField(unique=True)),
+                ('deposits', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('withdrawals', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('fees', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('outstanding', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+        ),
+        migrations.RunPython(seed_totals, migrations.RunPython.noop),
+    ]
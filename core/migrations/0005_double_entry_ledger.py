@@ -0,0 +1,73 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:20
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def post_existing_transactions(apps, schema_editor):
+    """Write double-entry legs for every transaction recorded before entries existed."""
+    Transaction = apps.get_model('core', 'Transaction')
+    LedgerEntry = apps.get_model('core', 'LedgerEntry')
+    batch = []
+    for tx in Transaction.objects.order_by('id').iterator(chunk_size=2000):
+        legs = []
+        if tx.type == 'deposit':
+            legs = [('cash', None, -tx.amount), ('account', tx.to_account_id, tx.amount - tx.fee)]
+        elif tx.type == 'withdraw':
+            legs = [('account', tx.from_account_id, -(tx.amount + tx.fee)), ('cash', None, tx.amount)]
+        else:
+            legs = [('account', tx.from_account_id, -(tx.amount + tx.fee)), ('account', tx.to_account_id, tx.amount)]
+        legs.append(('house', None, tx.fee))
+        for book, account_id, amount in legs:
+            if not amount:
+                continue
+            if book == 'account' and account_id is None:
+                # The account was deleted (SET_NULL); book the leg to cash so the posting still balances.
+                book = 'cash'
+            batch.append(LedgerEntry(transaction_id=tx.id, book=book, account_id=account_id,
+                                     amount=amount, created_at=tx.created_at))
+        if len(batch) >= 2000:
+            LedgerEntry.objects.bulk_create(batch)
+            batch = []
+    LedgerEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_system_totals'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book', models.CharField(choices=[('account', 'Customer account'), ('house', 'House fees'), ('cash', 'Cash settlement')], max_length=10)),
+                ('entry_id', models.BigIntegerField()),
+                ('balance', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='checkpoints', to='core.account')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['book', 'account', '-entry_id'], name='checkpoint_latest_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='LedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('book', models.CharField(choices=[('account', 'Customer account'), ('house', 'House fees'), ('cash', 'Cash settlement')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='core.account')),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='core.transaction')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['account', 'id'], name='entry_account_id_idx'), models.Index(fields=['book', 'id'], name='entry_book_id_idx')],
+                'constraints': [models.CheckConstraint(condition=models.Q(models.Q(('account__isnull', False), ('book', 'account')), models.Q(models.Q(('book', 'account'), _negated=True), ('account__isnull', True)), _connector='OR'), name='entry_account_matches_book')],
+            },
+        ),
+        migrations.RunPython(post_existing_transactions, migrations.RunPython.noop),
+    ]
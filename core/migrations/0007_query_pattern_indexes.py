@@ -0,0 +1,51 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:24
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_idempotency_keys'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='moneyrequest',
+            index=models.Index(fields=['target', 'created_at'], name='moneyreq_target_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moneyrequest',
+            index=models.Index(fields=['requester', 'created_at'], name='moneyreq_requester_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='moneyrequest',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['status', 'created_at'], name='moneyreq_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='profitrecord',
+            index=models.Index(fields=['created_at', 'id'], name='profit_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['created_at', 'id'], name='tx_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawalrequest',
+            index=models.Index(fields=['status', 'created_at'], name='withdrawal_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawalrequest',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['status', 'created_at'], name='withdrawal_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='withdrawalrequest',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['user', 'created_at'], name='withdrawal_user_pending_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='account',
+            constraint=models.CheckConstraint(condition=models.Q(('balance__gte', 0)), name='account_balance_non_negative'),
+        ),
+    ]
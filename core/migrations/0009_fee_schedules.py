@@ -0,0 +1,66 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:31
+
+import django.db.models.deletion
+import django.utils.timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def seed_schedule(apps, schema_editor):
+    """Version 1 reproduces the flat percentages from settings."""
+    FeeSchedule = apps.get_model('core', 'FeeSchedule')
+    FeeRule = apps.get_model('core', 'FeeRule')
+    schedule = FeeSchedule.objects.create(name='Flat rates from settings', active=True)
+    FeeRule.objects.bulk_create([
+        FeeRule(schedule=schedule, type=tx_type, percent=Decimal(str(percent)))
+        for tx_type, percent in (
+            ('transfer', settings.TRANSFER_FEE_PERCENT),
+            ('deposit', settings.DEPOSIT_FEE_PERCENT),
+            ('withdraw', settings.WITHDRAW_FEE_PERCENT),
+        )
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_job_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FeeSchedule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('active', models.BooleanField(default=False)),
+                ('note', models.CharField(blank=True, default='', max_length=255)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='fee_schedule',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.feeschedule'),
+        ),
+        migrations.CreateModel(
+            name='FeeRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('type', models.CharField(choices=[('transfer', 'Transfer'), ('deposit', 'Deposit'), ('withdraw', 'Withdraw')], max_length=10)),
+                ('min_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('percent', models.DecimalField(decimal_places=3, default=0, max_digits=6)),
+                ('flat', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('minimum_fee', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('cap', models.DecimalField(blank=True, decimal_places=2, max_digits=12, null=True)),
+                ('account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='fee_rules', to='core.account')),
+                ('schedule', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='rules', to='core.feeschedule')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('schedule', 'type', 'account', 'min_amount'), name='fee_rule_tier_uniq')],
+            },
+        ),
+        migrations.RunPython(seed_schedule, migrations.RunPython.noop),
+    ]
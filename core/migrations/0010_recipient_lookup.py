@@ -0,0 +1,20 @@
+from django.db import migrations
+
+
+def create_missing_accounts(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    Account = apps.get_model('core', 'Account')
+    missing = User.objects.filter(account__isnull=True).values_list('id', flat=True)
+    Account.objects.bulk_create([Account(user_id=user_id) for user_id in missing.iterator()], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0009_fee_schedules'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_missing_accounts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:46
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_recipient_lookup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Statement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField()),
+                ('period_end', models.DateField()),
+                ('opening_balance', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('closing_balance', models.DecimalField(decimal_places=2, max_digits=16)),
+                ('total_in', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_out', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('total_fees', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('entry_count', models.PositiveIntegerField(default=0)),
+                ('last_entry_id', models.BigIntegerField(blank=True, null=True)),
+                ('csv_path', models.CharField(max_length=255)),
+                ('pdf_path', models.CharField(max_length=255)),
+                ('csv_sha256', models.CharField(max_length=64)),
+                ('generated_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='statements', to='core.account')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period_end', 'account'], name='statement_period_end_idx')],
+                'constraints': [models.UniqueConstraint(fields=('account', 'period_start', 'period_end'), name='statement_period_uniq')],
+            },
+        ),
+    ]
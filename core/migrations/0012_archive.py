@@ -0,0 +1,86 @@
+# Generated by Django 5.2.2 on 2026-10-18 14:50
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_statements'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchiveMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(unique=True)),
+                ('transactions', models.PositiveIntegerField(default=0)),
+                ('profit_records', models.PositiveIntegerField(default=0)),
+                ('ledger_entries', models.PositiveIntegerField(default=0)),
+                ('export_path', models.CharField(blank=True, default='', max_length=255)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('archived_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedTransaction',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('fee', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('type', models.CharField(choices=[('transfer', 'Transfer'), ('deposit', 'Deposit'), ('withdraw', 'Withdraw')], max_length=10)),
+                ('created_at', models.DateTimeField()),
+                ('note', models.CharField(blank=True, default='', max_length=255)),
+                ('fee_schedule', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='core.feeschedule')),
+                ('from_account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_outgoing', to='core.account')),
+                ('to_account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='archived_incoming', to='core.account')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedProfitRecord',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField()),
+                ('transaction', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profit_record', to='core.archivedtransaction')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedLedgerEntry',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('book', models.CharField(choices=[('account', 'Customer account'), ('house', 'House fees'), ('cash', 'Cash settlement')], max_length=10)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('created_at', models.DateTimeField()),
+                ('account', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='archived_entries', to='core.account')),
+                ('transaction', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='entries', to='core.archivedtransaction')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(fields=['from_account', 'created_at', 'id'], name='archived_tx_from_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(fields=['to_account', 'created_at', 'id'], name='archived_tx_to_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedtransaction',
+            index=models.Index(fields=['created_at', 'id'], name='archived_tx_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedprofitrecord',
+            index=models.Index(fields=['created_at', 'id'], name='archived_profit_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedledgerentry',
+            index=models.Index(fields=['account', 'id'], name='archived_entry_account_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedledgerentry',
+            index=models.Index(fields=['book', 'id'], name='archived_entry_book_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+def drop_username_prefix_index(apps, schema_editor):
+    # Duplicated the auth_user_username_*_like index Django creates for the unique username.
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute('DROP INDEX IF EXISTS core_username_prefix_idx')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_idempotency_claimed_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_username_prefix_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.2 on 2026-10-18 15:16
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_drop_username_prefix_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='idempotencykey',
+            name='renewed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
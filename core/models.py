@@ -1,17 +1,100 @@
-from django.db import models
+from django.db import connection, models
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.core.validators import MinValueValidator
+from datetime import datetime, time
 from decimal import Decimal
+import heapq
 
 class Account(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='account')
     balance = models.DecimalField(max_digits=12, decimal_places=2, default=0, validators=[MinValueValidator(0)])
     qr_image = models.ImageField(upload_to='qrcodes/', blank=True, null=True)
 
+    class Meta:
+        constraints = [
+            # MinValueValidator only runs in forms; this holds for every write path.
+            models.CheckConstraint(condition=models.Q(balance__gte=0), name='account_balance_non_negative'),
+        ]
+
     def __str__(self):
         return f"{self.user.username} - Rs. {self.balance}"
 
+class TransactionQuerySet(models.QuerySet):
+    def for_account(self, account):
+        return self.filter(models.Q(from_account=account) | models.Q(to_account=account))
+
+    def _history_legs(self, account, before, limit):
+        legs = []
+        for field in ('from_account', 'to_account'):
+            leg = self.filter(**{field: account})
+            if before:
+                created_at, pk = before
+                leg = leg.filter(models.Q(created_at__lt=created_at) | models.Q(created_at=created_at, id__lt=pk))
+            legs.append(leg.order_by('-created_at', '-id').values_list('created_at', 'id')[:limit + 1])
+        if connection.features.supports_slicing_ordering_in_compound:
+            return legs[0].union(legs[1]).order_by('-created_at', '-id')[:limit + 1], None
+        return None, legs
+
+    def _history_page(self, keys, by_id, limit):
+        next_key = keys[limit - 1] if len(keys) > limit else None
+        return [by_id[pk] for _, pk in keys[:limit]], next_key
+
+    def history(self, account, before=None, limit=50):
+        """Keyset page of ``account``'s transactions, newest first.
+
+        ``before`` is a ``(created_at, id)`` key from a previous page. Each leg
+        (outgoing/incoming) walks its own ``(account, created_at, id)`` index
+        and the legs are combined with a UNION, so page cost does not grow
+        with history depth. A short page on ``Transaction`` is topped up from
+        ``ArchivedTransaction``, so paging runs on into archived months; a
+        full page that empties the hot table still returns a ``next_key``
+        once anything is archived. Returns ``(rows, next_key)``.
+        """
+        union, legs = self._history_legs(account, before, limit)
+        if union is not None:
+            keys = list(union)
+        else:
+            # SQLite can't LIMIT inside a compound select; merge the two sorted legs here instead.
+            keys = list(dict.fromkeys(heapq.merge(*legs, reverse=True)))[:limit + 1]
+        by_id = self.with_parties().in_bulk([pk for _, pk in keys[:limit]])
+        rows, next_key = self._history_page(keys, by_id, limit)
+        if len(rows) < limit and self.model is Transaction:
+            # The hot table ran out; older rows continue in the archive.
+            older, next_key = ArchivedTransaction.objects.using(self.db).history(
+                account, before=keys[-1] if keys else before, limit=limit - len(rows))
+            rows += older
+        elif next_key is None and self.model is Transaction and ArchiveMonth.objects.using(self.db).exists():
+            # A full page that emptied the hot table: the next page carries on in the archive.
+            next_key = keys[-1]
+        return rows, next_key
+
+    async def ahistory(self, account, before=None, limit=50):
+        """Async version of ``history()``."""
+        union, legs = self._history_legs(account, before, limit)
+        if union is not None:
+            keys = [key async for key in union]
+        else:
+            legs = [[key async for key in leg] for leg in legs]
+            keys = list(dict.fromkeys(heapq.merge(*legs, reverse=True)))[:limit + 1]
+        by_id = await self.with_parties().ain_bulk([pk for _, pk in keys[:limit]])
+        rows, next_key = self._history_page(keys, by_id, limit)
+        if len(rows) < limit and self.model is Transaction:
+            older, next_key = await ArchivedTransaction.objects.using(self.db).ahistory(
+                account, before=keys[-1] if keys else before, limit=limit - len(rows))
+            rows += older
+        elif next_key is None and self.model is Transaction and await ArchiveMonth.objects.using(self.db).aexists():
+            next_key = keys[-1]
+        return rows, next_key
+
+    def with_parties(self):
+        """Join both account->user chains and load only what listings render."""
+        return self.select_related('from_account__user', 'to_account__user').only(
+            'id', 'type', 'amount', 'fee', 'created_at', 'note',
+            'from_account__balance', 'from_account__user__username',
+            'to_account__balance', 'to_account__user__username',
+        )
+
 class Transaction(models.Model):
     TRANSFER = 'transfer'
     DEPOSIT = 'deposit'
@@ -28,6 +111,17 @@ class Transaction(models.Model):
     type = models.CharField(max_length=10, choices=TYPES)
     created_at = models.DateTimeField(default=timezone.now)
     note = models.CharField(max_length=255, blank=True, default='')
+    # Version of the fee schedule that priced ``fee``; null for fees from before schedules existed.
+    fee_schedule = models.ForeignKey('FeeSchedule', on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+
+    objects = TransactionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['from_account', 'created_at', 'id'], name='tx_from_created_idx'),
+            models.Index(fields=['to_account', 'created_at', 'id'], name='tx_to_created_idx'),
+            models.Index(fields=['created_at', 'id'], name='tx_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.type} Rs.{self.amount} (fee Rs.{self.fee})"
@@ -37,9 +131,25 @@ class ProfitRecord(models.Model):
     amount = models.DecimalField(max_digits=12, decimal_places=2)
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='profit_created_idx'),
+        ]
+
     def __str__(self):
         return f"Profit Rs.{self.amount} on {self.transaction_id}"
 
+class MoneyRequestQuerySet(models.QuerySet):
+    def pending(self):
+        return self.filter(status=MoneyRequest.PENDING)
+
+    def with_parties(self):
+        return self.select_related('requester__user', 'target__user').only(
+            'id', 'amount', 'status', 'created_at', 'note',
+            'requester__balance', 'requester__user__username',
+            'target__balance', 'target__user__username',
+        )
+
 class MoneyRequest(models.Model):
     PENDING = 'pending'
     APPROVED = 'approved'
@@ -56,9 +166,26 @@ class MoneyRequest(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     note = models.CharField(max_length=255, blank=True, default='')
 
+    objects = MoneyRequestQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['target', 'created_at'], name='moneyreq_target_created_idx'),
+            models.Index(fields=['requester', 'created_at'], name='moneyreq_requester_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='moneyreq_pending_idx',
+                         condition=models.Q(status='pending')),
+        ]
+
     def __str__(self):
         return f"Req Rs.{self.amount} {self.requester} -> {self.target} ({self.status})"
 
+class WithdrawalRequestQuerySet(models.QuerySet):
+    def pending(self):
+        return self.filter(status=WithdrawalRequest.PENDING)
+
+    def with_user(self):
+        return self.select_related('user').only('id', 'amount', 'status', 'created_at', 'note', 'user__username')
+
 class WithdrawalRequest(models.Model):
     PENDING = 'pending'
     APPROVED = 'approved'
@@ -74,5 +201,347 @@ class WithdrawalRequest(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     note = models.CharField(max_length=255, blank=True, default='')
 
+    objects = WithdrawalRequestQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='withdrawal_status_created_idx'),
+            models.Index(fields=['status', 'created_at'], name='withdrawal_pending_idx',
+                         condition=models.Q(status='pending')),
+            models.Index(fields=['user', 'created_at'], name='withdrawal_user_pending_idx',
+                         condition=models.Q(status='pending')),
+        ]
+
     def __str__(self):
         return f"Withdrawal Rs.{self.amount} by {self.user.username} ({self.status})"
+
+class DailyLedgerStats(models.Model):
+    """Per-day, per-type volume and fee totals, kept current by the ledger.
+
+    Each (day, type) is split over a few ``shard`` rows so concurrent writers
+    don't all queue on one hot row; readers sum the shards.
+    """
+    day = models.DateField()
+    type = models.CharField(max_length=10, choices=Transaction.TYPES)
+    shard = models.PositiveSmallIntegerField(default=0)
+    count = models.PositiveIntegerField(default=0)
+    volume = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    fees = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'type', 'shard'], name='daily_stats_day_type_shard_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.type}: {self.count} tx, Rs.{self.volume} (fees Rs.{self.fees})"
+
+class AccountDailyStats(models.Model):
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='daily_stats')
+    day = models.DateField()
+    credited = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    debited = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    fees = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'day'], name='account_daily_stats_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.account_id} {self.day}: +{self.credited} -{self.debited}"
+
+class SystemTotals(models.Model):
+    """Running system-wide totals, kept current by the ledger.
+
+    Sharded like ``DailyLedgerStats``; the true figure is the sum over shards.
+    """
+    shard = models.PositiveSmallIntegerField(unique=True)
+    deposits = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    withdrawals = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    fees = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    outstanding = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    def __str__(self):
+        return f"Totals shard {self.shard}: outstanding Rs.{self.outstanding}"
+
+class LedgerEntry(models.Model):
+    """One leg of a double-entry posting; the legs of a transaction sum to zero.
+
+    ``amount`` is signed from the point of view of the book: positive credits
+    it, negative debits it. Customer legs point at an ``Account``; the house
+    (fee income) and cash (money entering/leaving the system) books have none.
+    """
+    ACCOUNT = 'account'
+    HOUSE = 'house'
+    CASH = 'cash'
+    BOOKS = [
+        (ACCOUNT, 'Customer account'),
+        (HOUSE, 'House fees'),
+        (CASH, 'Cash settlement'),
+    ]
+    transaction = models.ForeignKey(Transaction, on_delete=models.PROTECT, related_name='entries')
+    book = models.CharField(max_length=10, choices=BOOKS)
+    account = models.ForeignKey(Account, on_delete=models.PROTECT, null=True, blank=True, related_name='entries')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['account', 'id'], name='entry_account_id_idx'),
+            models.Index(fields=['book', 'id'], name='entry_book_id_idx'),
+        ]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(book='account', account__isnull=False) | models.Q(~models.Q(book='account'), account__isnull=True),
+                name='entry_account_matches_book',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.book}:{self.account_id or '-'} {self.amount:+} (tx {self.transaction_id})"
+
+class BalanceCheckpoint(models.Model):
+    """Balance of a book as of ``entry_id`` (inclusive); reads add entries after it."""
+    book = models.CharField(max_length=10, choices=LedgerEntry.BOOKS)
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, null=True, blank=True, related_name='checkpoints')
+    entry_id = models.BigIntegerField()
+    balance = models.DecimalField(max_digits=16, decimal_places=2)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['book', 'account', '-entry_id'], name='checkpoint_latest_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.book}:{self.account_id or '-'} Rs.{self.balance} @ entry {self.entry_id}"
+
+class Statement(models.Model):
+    """One account's statement for ``[period_start, period_end)`` and its files in storage.
+
+    ``entry_count`` and ``last_entry_id`` record the ledger entries it covers, so
+    a re-run can tell whether the period has changed since it was generated.
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='statements')
+    period_start = models.DateField()
+    period_end = models.DateField()  # exclusive
+    opening_balance = models.DecimalField(max_digits=16, decimal_places=2)
+    closing_balance = models.DecimalField(max_digits=16, decimal_places=2)
+    total_in = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_out = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    total_fees = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    entry_count = models.PositiveIntegerField(default=0)
+    last_entry_id = models.BigIntegerField(null=True, blank=True)
+    csv_path = models.CharField(max_length=255)
+    pdf_path = models.CharField(max_length=255)
+    csv_sha256 = models.CharField(max_length=64)
+    generated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'period_start', 'period_end'], name='statement_period_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['period_end', 'account'], name='statement_period_end_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.account_id} {self.period_start}..{self.period_end}"
+
+class IdempotencyKey(models.Model):
+    """A client retry key and the response it produced, for replaying duplicates."""
+    IN_FLIGHT = 'in_flight'
+    DONE = 'done'
+    STATUSES = [
+        (IN_FLIGHT, 'In flight'),
+        (DONE, 'Done'),
+    ]
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=64)
+    fingerprint = models.CharField(max_length=64)
+    status = models.CharField(max_length=10, choices=STATUSES, default=IN_FLIGHT)
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True)
+    response_headers = models.JSONField(default=dict, blank=True)
+    response_body = models.BinaryField(default=b'', blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    # Identifies the current claim; a retry that takes over a lapsed claim sets a new one.
+    claimed_at = models.DateTimeField(default=timezone.now)
+    # In-flight claims lapse IDEMPOTENCY_LEASE seconds after this; the running request keeps renewing it.
+    renewed_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.key} ({self.status})"
+
+class Job(models.Model):
+    """A unit of background work, claimed by ``run_workers`` with SKIP LOCKED."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    task = models.CharField(max_length=64)
+    payload = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    priority = models.SmallIntegerField(default=0)  # higher runs first
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=64, blank=True, default='')
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    last_error = models.TextField(blank=True, default='')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-priority', 'run_at', 'id'], name='job_queued_idx',
+                         condition=models.Q(status='queued')),
+            models.Index(fields=['locked_at'], name='job_running_idx',
+                         condition=models.Q(status='running')),
+            models.Index(fields=['status', 'created_at'], name='job_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.id} ({self.status})"
+
+class FeeSchedule(models.Model):
+    """A version of the fee rules. The newest active schedule prices new transactions."""
+    name = models.CharField(max_length=100)
+    active = models.BooleanField(default=False)
+    note = models.CharField(max_length=255, blank=True, default='')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"v{self.id} {self.name}{' (active)' if self.active else ''}"
+
+class FeeRule(models.Model):
+    """One tier of a schedule: applies to amounts from ``min_amount`` up to the next tier.
+
+    The fee is ``amount * percent / 100 + flat``, raised to ``minimum_fee`` and
+    lowered to ``cap`` when set. Rules with an ``account`` override the
+    schedule's general tiers for that account's transactions (as the payer,
+    or the recipient of a deposit).
+    """
+    schedule = models.ForeignKey(FeeSchedule, on_delete=models.CASCADE, related_name='rules')
+    type = models.CharField(max_length=10, choices=Transaction.TYPES)
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, null=True, blank=True, related_name='fee_rules')
+    min_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    percent = models.DecimalField(max_digits=6, decimal_places=3, default=0)
+    flat = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    minimum_fee = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    cap = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['schedule', 'type', 'account', 'min_amount'], name='fee_rule_tier_uniq'),
+        ]
+
+    def __str__(self):
+        who = f" acct {self.account_id}" if self.account_id else ""
+        return f"{self.type}{who} from Rs.{self.min_amount}: {self.percent}% + Rs.{self.flat}"
+
+class ArchiveMonthQuerySet(models.QuerySet):
+    def horizon(self):
+        """Aware start of the first month not archived, or None if nothing is archived.
+
+        Everything older than this lives in the archive tables; nothing newer does.
+        """
+        latest = self.aggregate(latest=models.Max('month'))['latest']
+        if latest is None:
+            return None
+        following = latest.replace(year=latest.year + latest.month // 12, month=latest.month % 12 + 1)
+        return timezone.make_aware(datetime.combine(following, time.min))
+
+class ArchiveMonth(models.Model):
+    """A calendar month of transactions moved to the archive tables by ``archive_ledger``.
+
+    The row is written before the first batch moves, so ``horizon()`` covers a
+    month that is only partly archived; ``archived_at`` is set once it is done.
+    """
+    month = models.DateField(unique=True)  # first day
+    transactions = models.PositiveIntegerField(default=0)
+    profit_records = models.PositiveIntegerField(default=0)
+    ledger_entries = models.PositiveIntegerField(default=0)
+    export_path = models.CharField(max_length=255, blank=True, default='')
+    started_at = models.DateTimeField(default=timezone.now)
+    archived_at = models.DateTimeField(null=True, blank=True)
+
+    objects = ArchiveMonthQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.month:%Y-%m}: {self.transactions} tx archived"
+
+class ArchivedTransaction(models.Model):
+    """A ``Transaction`` moved out of the hot table; same id and columns."""
+    id = models.BigIntegerField(primary_key=True)
+    from_account = models.ForeignKey(Account, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_outgoing')
+    to_account = models.ForeignKey(Account, on_delete=models.SET_NULL, null=True, blank=True, related_name='archived_incoming')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    fee = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    type = models.CharField(max_length=10, choices=Transaction.TYPES)
+    created_at = models.DateTimeField()
+    note = models.CharField(max_length=255, blank=True, default='')
+    fee_schedule = models.ForeignKey('FeeSchedule', on_delete=models.PROTECT, null=True, blank=True, related_name='+')
+
+    objects = TransactionQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['from_account', 'created_at', 'id'], name='archived_tx_from_idx'),
+            models.Index(fields=['to_account', 'created_at', 'id'], name='archived_tx_to_idx'),
+            models.Index(fields=['created_at', 'id'], name='archived_tx_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.type} Rs.{self.amount} (fee Rs.{self.fee}, archived)"
+
+class ArchivedProfitRecord(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    transaction = models.OneToOneField(ArchivedTransaction, on_delete=models.CASCADE, related_name='profit_record')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'id'], name='archived_profit_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"Profit Rs.{self.amount} on {self.transaction_id} (archived)"
+
+class ArchivedLedgerEntry(models.Model):
+    """A ``LedgerEntry`` moved out of the hot table; same id and columns.
+
+    Before a book's entries move here it gets a ``BalanceCheckpoint`` at or past
+    the last of them, so ``ledger.derived_balance`` never needs to read this table.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    transaction = models.ForeignKey(ArchivedTransaction, on_delete=models.PROTECT, related_name='entries')
+    book = models.CharField(max_length=10, choices=LedgerEntry.BOOKS)
+    account = models.ForeignKey(Account, on_delete=models.PROTECT, null=True, blank=True, related_name='archived_entries')
+    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['account', 'id'], name='archived_entry_account_idx'),
+            models.Index(fields=['book', 'id'], name='archived_entry_book_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.book}:{self.account_id or '-'} {self.amount:+} (tx {self.transaction_id}, archived)"
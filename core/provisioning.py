@@ -0,0 +1,160 @@
+"""Bulk user provisioning: CSV rows -> users, accounts, opening deposits, QR codes.
+
+Password hashing (PBKDF2, deliberately slow) dominates an import, so it runs
+across a process pool. Each chunk is then written in one transaction with
+bulk inserts: the ``User`` rows, their ``Account`` rows, and opening balances
+as deposit transactions through ``ledger.bulk_deposit`` (the deposit fee
+applies, as for an admin deposit). Usernames that already exist, or repeat an
+earlier row, are skipped, so a failed import can simply be run again.
+"""
+import csv
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import IntegrityError, transaction
+
+from . import fees, jobs, ledger, lookup
+from .models import Account
+from .utils import pay_path, render_qr_png, store_qr_png
+
+COLUMNS = ('username', 'password', 'email', 'first_name', 'last_name', 'opening_balance')
+REPORT_HEADER = ['row', 'username', 'status', 'account_id', 'error']
+CREATED, SKIPPED, FAILED = 'created', 'skipped', 'failed'
+
+# Fork keeps the configured password hashers in the pool processes.
+_context = multiprocessing.get_context('fork')
+
+
+def read_rows(lines):
+    """Stream ``(row_number, row)`` from CSV lines with a header; only ``username`` is required."""
+    reader = csv.DictReader(lines)
+    if 'username' not in (reader.fieldnames or []):
+        raise ValueError("The CSV needs a header row with a 'username' column.")
+    for i, row in enumerate(reader, start=1):
+        values = {name: (row.get(name) or '') for name in COLUMNS}
+        yield i, {name: value if name == 'password' else value.strip() for name, value in values.items()}
+
+
+def _clean(row):
+    if not row['username']:
+        raise ValidationError("Missing username.")
+    User._meta.get_field('username').run_validators(row['username'])
+    if row['email']:
+        validate_email(row['email'])
+    balance = row['opening_balance']
+    if not balance:
+        return None
+    balance = ledger._parse_amount(balance)
+    # New accounts have no per-account overrides, so the general tier prices the deposit.
+    ledger.deposit_fee(fees.current(), balance)
+    return balance
+
+
+def _hash(password):
+    # Blank passwords get an unusable hash: the member must reset before logging in.
+    return make_password(password or None)
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _result(number, username, status, account_id=None, error=''):
+    return {'row': number, 'username': username, 'status': status, 'account_id': account_id, 'error': error}
+
+
+def _apply_chunk(chunk, seen, mapper, render_qr, note):
+    results, valid = {}, []
+    for number, row in chunk:
+        try:
+            balance = _clean(row)
+        except (ValidationError, ValueError) as e:
+            message = '; '.join(e.messages) if isinstance(e, ValidationError) else str(e)
+            results[number] = _result(number, row['username'], FAILED, error=message)
+            continue
+        if row['username'] in seen:
+            results[number] = _result(number, row['username'], SKIPPED, error="Duplicate username in file.")
+            continue
+        seen.add(row['username'])
+        valid.append((number, row, balance))
+
+    existing = set(User.objects.filter(username__in=[row['username'] for _, row, _ in valid])
+                   .values_list('username', flat=True))
+    for number, row, _ in valid:
+        if row['username'] in existing:
+            results[number] = _result(number, row['username'], SKIPPED, error="Username already exists.")
+    valid = [v for v in valid if v[1]['username'] not in existing]
+
+    hashes = list(mapper(_hash, [row['password'] for _, row, _ in valid]))
+    try:
+        with transaction.atomic():
+            users = User.objects.bulk_create([
+                User(username=row['username'], email=row['email'], first_name=row['first_name'],
+                     last_name=row['last_name'], password=password)
+                for (_, row, _), password in zip(valid, hashes)
+            ])
+            accounts = Account.objects.bulk_create([Account(user=user) for user in users])
+            deposits = [(acc.id, balance) for acc, (_, _, balance) in zip(accounts, valid) if balance]
+            if deposits:
+                ledger.bulk_deposit(deposits, note)
+            usernames = [user.username for user in users]
+            transaction.on_commit(lambda: lookup.forget(*usernames))
+            if accounts and not render_qr and settings.QR_MODE == 'file' and settings.QR_GENERATE_ON_CREATE:
+                # bulk_create skips the post_save signal that normally queues these.
+                jobs.enqueue('qr.generate', {'account_ids': [acc.id for acc in accounts]}, priority=-1)
+    except IntegrityError:
+        for number, row, _ in valid:
+            results[number] = _result(number, row['username'], FAILED,
+                                      error="Username taken while importing; run the import again.")
+        return [results[number] for number, _ in chunk]
+
+    if render_qr and accounts:
+        urls = [f"{settings.QR_BASE_URL}{pay_path(acc.id)}" for acc in accounts]
+        for acc, url, png in zip(accounts, urls, mapper(render_qr_png, urls)):
+            acc.qr_image = store_qr_png(url, png)
+        Account.objects.bulk_update(accounts, ['qr_image'])
+
+    for (number, row, _), acc in zip(valid, accounts):
+        results[number] = _result(number, row['username'], CREATED, acc.id)
+    return [results[number] for number, _ in chunk]
+
+
+def import_users(rows, chunk_size=None, workers=None, render_qr=False, note="Opening balance", progress=None):
+    """Create users from ``read_rows()`` output, yielding one result dict per row in input order.
+
+    ``workers`` processes hash passwords (and render QR codes when
+    ``render_qr``); ``progress`` is called with the running status counts
+    after each chunk.
+    """
+    chunk_size = chunk_size or settings.USER_IMPORT_CHUNK_SIZE
+    workers = workers or settings.USER_IMPORT_WORKERS
+    counts = {CREATED: 0, SKIPPED: 0, FAILED: 0}
+    seen = set()
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=_context) if workers > 1 else None
+    try:
+        if pool is None:
+            mapper = map
+        else:
+            def mapper(func, items):
+                return pool.map(func, items, chunksize=max(1, len(items) // (workers * 4)))
+        for chunk in _chunks(rows, chunk_size):
+            for result in _apply_chunk(chunk, seen, mapper, render_qr, note):
+                counts[result['status']] += 1
+                yield result
+            if progress is not None:
+                progress(dict(counts))
+    finally:
+        if pool is not None:
+            pool.shutdown()
@@ -0,0 +1,57 @@
+"""Profit report rows, shared by the streaming CSV view and the background export job."""
+import heapq
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from . import rollups
+from .models import ArchivedProfitRecord, ArchiveMonth, ProfitRecord
+
+PROFIT_HEADER = ['Date', 'Transaction', 'Type', 'From', 'To', 'Amount', 'Profit']
+SUMMARY_HEADER = ['Date', 'Type', 'Count', 'Volume', 'Profit']
+
+
+def parse_day(value):
+    """Aware local midnight for a ``YYYY-MM-DD`` string, or None if blank."""
+    if not value:
+        return None
+    day = parse_date(value)
+    if day is None:
+        raise ValueError(f"Invalid date: {value!r} (expected YYYY-MM-DD).")
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _profit_records(model, start, end, tx_type, using):
+    records = model.objects.using(using).order_by('created_at', 'id')
+    if start:
+        records = records.filter(created_at__gte=start)
+    if end:
+        records = records.filter(created_at__lt=end + timedelta(days=1))
+    if tx_type:
+        records = records.filter(transaction__type=tx_type)
+    return records.values_list(
+        'created_at', 'transaction_id', 'transaction__type',
+        'transaction__from_account__user__username', 'transaction__to_account__user__username',
+        'transaction__amount', 'amount',
+    ).iterator(chunk_size=settings.REPORT_CHUNK_SIZE)
+
+
+def profit_rows(start, end, tx_type, using='default'):
+    """One row per profit record in ``[start, end + 1 day)``, oldest first, archived records included."""
+    rows = _profit_records(ProfitRecord, start, end, tx_type, using)
+    horizon = ArchiveMonth.objects.using(using).horizon()
+    if horizon is not None and (start is None or start < horizon):
+        archived = _profit_records(ArchivedProfitRecord, start, end, tx_type, using)
+        rows = heapq.merge(archived, rows, key=lambda row: row[:2])
+    for created_at, tx_id, kind, from_user, to_user, amount, profit in rows:
+        yield [
+            timezone.localtime(created_at).strftime('%Y-%m-%d %H:%M:%S'),
+            tx_id, kind, from_user or '', to_user or '', amount, profit,
+        ]
+
+
+def daily_summary_rows(start, end, tx_type, using='default'):
+    for row in rollups.daily_rows(start and start.date(), end and end.date(), tx_type, using=using):
+        yield [row['day'].isoformat(), row['type'], row['count'], row['volume'], row['fees']]
@@ -0,0 +1,219 @@
+"""Daily rollups and running totals of ledger activity.
+
+The ledger calls ``record()`` inside the same transaction that moves the
+money, so ``DailyLedgerStats``, ``AccountDailyStats`` and ``SystemTotals``
+are always in step with ``Transaction``. Dashboards and reports read these instead of
+aggregating the transaction table; ``backfill()`` rebuilds them from history.
+"""
+import random
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min, Max, Sum
+from django.utils import timezone
+
+from .models import (
+    Account, AccountDailyStats, ArchivedTransaction, ArchiveMonth, DailyLedgerStats, SystemTotals, Transaction,
+)
+
+ZERO = Decimal('0.00')
+TOTALS_FIELDS = ('deposits', 'withdrawals', 'fees', 'outstanding')
+
+
+def _money(value):
+    # SQLite sums decimals as floats; normalise back to 2dp.
+    return Decimal(value or 0).quantize(ZERO)
+
+
+def _bump(model, keys, increments):
+    """Add ``increments`` to the row identified by ``keys``, creating it if needed."""
+    updates = {field: F(field) + value for field, value in increments.items()}
+    if model.objects.filter(**keys).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **increments)
+    except IntegrityError:
+        model.objects.filter(**keys).update(**updates)
+
+
+def _account_legs(tx):
+    """Yield ``(account_id, credited, debited, fees)`` for each side of ``tx``."""
+    if tx.from_account_id:
+        yield tx.from_account_id, ZERO, tx.amount + tx.fee, tx.fee
+    if tx.to_account_id:
+        if tx.type == Transaction.DEPOSIT:
+            yield tx.to_account_id, tx.amount - tx.fee, ZERO, tx.fee
+        else:
+            yield tx.to_account_id, tx.amount, ZERO, ZERO
+
+
+def _totals_delta(tx):
+    """How ``tx`` moves each ``SystemTotals`` column."""
+    if tx.type == Transaction.DEPOSIT:
+        return {'deposits': tx.amount, 'withdrawals': ZERO, 'fees': tx.fee, 'outstanding': tx.amount - tx.fee}
+    if tx.type == Transaction.WITHDRAW:
+        return {'deposits': ZERO, 'withdrawals': tx.amount, 'fees': tx.fee, 'outstanding': -(tx.amount + tx.fee)}
+    return {'deposits': ZERO, 'withdrawals': ZERO, 'fees': tx.fee, 'outstanding': -tx.fee}
+
+
+def record(txs):
+    """Fold freshly written transactions into the daily rollups and totals."""
+    daily = defaultdict(lambda: [0, ZERO, ZERO])
+    per_account = defaultdict(lambda: [ZERO, ZERO, ZERO, 0])
+    totals_delta = dict.fromkeys(TOTALS_FIELDS, ZERO)
+    for tx in txs:
+        for field, value in _totals_delta(tx).items():
+            totals_delta[field] += value
+        day = timezone.localdate(tx.created_at)
+        totals = daily[(day, tx.type)]
+        totals[0] += 1
+        totals[1] += tx.amount
+        totals[2] += tx.fee
+        for account_id, credited, debited, fees in _account_legs(tx):
+            totals = per_account[(account_id, day)]
+            totals[0] += credited
+            totals[1] += debited
+            totals[2] += fees
+            totals[3] += 1
+
+    shard = random.randrange(settings.LEDGER_STATS_SHARDS)
+    # Sorted so concurrent writers touch rollup rows in the same order.
+    for (day, tx_type), (count, volume, fees) in sorted(daily.items()):
+        _bump(DailyLedgerStats, {'day': day, 'type': tx_type, 'shard': shard},
+              {'count': count, 'volume': volume, 'fees': fees})
+    for (account_id, day), (credited, debited, fees, count) in sorted(per_account.items()):
+        _bump(AccountDailyStats, {'account_id': account_id, 'day': day},
+              {'credited': credited, 'debited': debited, 'fees': fees, 'count': count})
+    _bump(SystemTotals, {'shard': shard}, totals_delta)
+
+
+def system_totals():
+    """Current system totals: one query over at most ``LEDGER_STATS_SHARDS`` rows."""
+    sums = SystemTotals.objects.aggregate(**{field: Sum(field) for field in TOTALS_FIELDS})
+    return {field: _money(value) for field, value in sums.items()}
+
+
+def recompute_totals():
+    """System totals derived from scratch: transactions by type, plus the live balance sum."""
+    amounts, fees = defaultdict(lambda: ZERO), ZERO
+    for model in (ArchivedTransaction, Transaction):
+        for row in model.objects.values('type').annotate(amount=Sum('amount'), fee=Sum('fee')).order_by():
+            amounts[row['type']] += _money(row['amount'])
+            fees += _money(row['fee'])
+    totals = {
+        'deposits': amounts[Transaction.DEPOSIT],
+        'withdrawals': amounts[Transaction.WITHDRAW],
+        'fees': fees,
+    }
+    totals['outstanding'] = totals['deposits'] - totals['withdrawals'] - fees
+    totals['balances'] = _money(Account.objects.aggregate(total=Sum('balance'))['total'])
+    return totals
+
+
+@transaction.atomic
+def reset_totals(totals):
+    SystemTotals.objects.all().delete()
+    SystemTotals.objects.create(shard=0, **{field: totals[field] for field in TOTALS_FIELDS})
+
+
+def daily_rows(start=None, end=None, tx_type=None, using=None):
+    """Yield per-day, per-type totals for ``start <= day <= end``, shards summed."""
+    rows = DailyLedgerStats.objects.using(using) if using else DailyLedgerStats.objects.all()
+    if start:
+        rows = rows.filter(day__gte=start)
+    if end:
+        rows = rows.filter(day__lte=end)
+    if tx_type:
+        rows = rows.filter(type=tx_type)
+    rows = rows.values('day', 'type').annotate(
+        count=Sum('count'), volume=Sum('volume'), fees=Sum('fees'),
+    ).order_by('day', 'type')
+    for row in rows.iterator():
+        row['volume'] = _money(row['volume'])
+        row['fees'] = _money(row['fees'])
+        yield row
+
+
+def day_totals(day):
+    """``{type: {'count', 'volume', 'fees'}}`` plus an overall ``'fees'`` total for one day."""
+    by_type = {row['type']: row for row in daily_rows(day, day)}
+    return {
+        'by_type': by_type,
+        'fees': sum((row['fees'] for row in by_type.values()), ZERO),
+    }
+
+
+def _day_bounds(day):
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    return start, start + timedelta(days=1)
+
+
+@transaction.atomic
+def rebuild_day(day):
+    """Recompute one day's rollups from its transactions, archived ones included."""
+    start, end = _day_bounds(day)
+    horizon = ArchiveMonth.objects.horizon()
+    sources = [Transaction] if horizon is None or start >= horizon else [ArchivedTransaction, Transaction]
+    DailyLedgerStats.objects.filter(day=day).delete()
+    AccountDailyStats.objects.filter(day=day).delete()
+
+    per_type = defaultdict(lambda: [0, ZERO, ZERO])
+    per_account = defaultdict(lambda: [ZERO, ZERO, ZERO, 0])
+    for model in sources:
+        txs = model.objects.filter(created_at__gte=start, created_at__lt=end)
+        for row in txs.values('type').annotate(count=Count('id'), volume=Sum('amount'), fees=Sum('fee')).order_by():
+            totals = per_type[row['type']]
+            totals[0] += row['count']
+            totals[1] += _money(row['volume'])
+            totals[2] += _money(row['fees'])
+        legs = (
+            txs.exclude(from_account=None).values('from_account_id').annotate(
+                debited=Sum(F('amount') + F('fee')), fees=Sum('fee'), count=Count('id')).order_by(),
+            txs.exclude(to_account=None).values('to_account_id', 'type').annotate(
+                amount=Sum('amount'), fees=Sum('fee'), count=Count('id')).order_by(),
+        )
+        for row in legs[0].iterator():
+            totals = per_account[row['from_account_id']]
+            totals[1] += _money(row['debited'])
+            totals[2] += _money(row['fees'])
+            totals[3] += row['count']
+        for row in legs[1].iterator():
+            totals = per_account[row['to_account_id']]
+            if row['type'] == Transaction.DEPOSIT:
+                totals[0] += _money(row['amount']) - _money(row['fees'])
+                totals[2] += _money(row['fees'])
+            else:
+                totals[0] += _money(row['amount'])
+            totals[3] += row['count']
+    DailyLedgerStats.objects.bulk_create([
+        DailyLedgerStats(day=day, type=tx_type, count=count, volume=volume, fees=fees)
+        for tx_type, (count, volume, fees) in per_type.items()
+    ])
+    AccountDailyStats.objects.bulk_create([
+        AccountDailyStats(account_id=account_id, day=day, credited=credited, debited=debited, fees=fees, count=count)
+        for account_id, (credited, debited, fees, count) in per_account.items()
+    ], batch_size=1000)
+
+
+def backfill(start=None, end=None):
+    """Rebuild rollups day by day; defaults to the full transaction history.
+
+    Yields each day as it is finished, so callers can report progress.
+    """
+    if start is None or end is None:
+        bounds = [model.objects.aggregate(first=Min('created_at'), last=Max('created_at'))
+                  for model in (ArchivedTransaction, Transaction)]
+        firsts = [b['first'] for b in bounds if b['first'] is not None]
+        if not firsts:
+            return
+        start = start or timezone.localdate(min(firsts))
+        end = end or timezone.localdate(max(b['last'] for b in bounds if b['last'] is not None))
+    day = start
+    while day <= end:
+        rebuild_day(day)
+        yield day
+        day += timedelta(days=1)
@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import jobs
+from .models import Account
+
+
+@receiver(post_save, sender=Account)
+def pregenerate_qr(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and settings.QR_MODE == 'file' and settings.QR_GENERATE_ON_CREATE:
+        # Queued with the account row; view_qr still renders on demand if no worker has run yet.
+        jobs.enqueue('qr.generate', {'account_ids': [instance.id]}, priority=-1)
+
+
+@receiver(post_save, sender=User)
+def create_account(sender, instance, created, raw=False, **kwargs):
+    # Every user has an account from the start, so request paths never need get_or_create.
+    if created and not raw:
+        Account.objects.get_or_create(user=instance)
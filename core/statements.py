@@ -0,0 +1,309 @@
+"""Periodic account statements: opening balance, every movement, closing balance.
+
+Statements are built from the account's ledger entries (``LedgerEntry`` legs
+on the account book), streamed with ``.iterator()`` and folded into running
+sums, so memory stays flat however busy an account is. Accounts are handled in
+batches across a process pool; each batch does a handful of grouped queries
+(previous closings, opening sums, period activity, existing statements) and
+then one streamed query per account that needs a new file.
+
+A period's opening balance is the previous period's closing balance when that
+statement exists, so months chain without re-summing history. Re-running a
+period only regenerates statements whose opening balance or entries
+(count, highest id) changed, which makes generation resumable and
+incremental; late-committing entries are picked up on the next run.
+Periods before the archive horizon also read ``ArchivedLedgerEntry``
+(see ``core.archive``), so old statements can be regenerated after archival.
+"""
+import csv
+import hashlib
+import heapq
+import io
+import multiprocessing
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from itertools import repeat
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.db import connections
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from .models import Account, ArchivedLedgerEntry, ArchiveMonth, LedgerEntry, Statement, Transaction
+from .utils import replace_stored_file
+
+STATEMENTS_DIR = 'statements'
+HEADER = ['Date', 'Transaction', 'Type', 'Counterparty', 'Note', 'Amount', 'Fee', 'Change', 'Balance']
+MANIFEST_HEADER = ['account_id', 'username', 'opening_balance', 'total_in', 'total_out', 'total_fees',
+                   'closing_balance', 'entries', 'csv', 'pdf', 'csv_sha256', 'generated_at']
+ZERO = Decimal('0.00')
+
+# Fork keeps the configured Django (settings, app registry) in each worker.
+_context = multiprocessing.get_context('fork')
+
+
+def month_bounds(value):
+    """``(first day, first day of next month)`` for a ``YYYY-MM`` string."""
+    try:
+        year, month = (int(part) for part in value.split('-'))
+        start = date(year, month, 1)
+    except ValueError:
+        raise ValueError(f"Invalid month: {value!r} (expected YYYY-MM).")
+    return start, date(year + month // 12, month % 12 + 1, 1)
+
+
+def previous_month():
+    """``YYYY-MM`` of last month (local time)."""
+    return f"{timezone.localdate().replace(day=1) - timedelta(days=1):%Y-%m}"
+
+
+def _aware(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+
+def _period_dir(start, end):
+    if start.day == 1 and end == month_bounds(f"{start:%Y-%m}")[1]:
+        return f"{STATEMENTS_DIR}/{start:%Y-%m}"
+    return f"{STATEMENTS_DIR}/{start}_{end}"
+
+
+class _PdfWriter:
+    """Just enough PDF for a printable statement: A4 pages of Courier text, written as it goes."""
+    LINES_PER_PAGE = 72
+
+    def __init__(self, out):
+        self.out = out
+        self.offsets = {}
+        self.pages = []
+        self.lines = []
+        self._write(b"%PDF-1.4\n")
+        self._object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+        self._object(3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>")
+        self.next_id = 4
+
+    def _write(self, data):
+        self.out.write(data)
+
+    def _object(self, number, body):
+        self.offsets[number] = self.out.tell()
+        self._write(b"%d 0 obj\n" % number + body + b"\nendobj\n")
+
+    def line(self, text=''):
+        self.lines.append(text)
+        if len(self.lines) == self.LINES_PER_PAGE:
+            self._flush_page()
+
+    def _flush_page(self):
+        escaped = (text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)') for text in self.lines)
+        body = "BT /F1 8 Tf 10 TL 36 806 Td " + " ".join(f"({t}) '" for t in escaped) + " ET"
+        stream = body.encode('latin-1', 'replace')
+        content, page = self.next_id, self.next_id + 1
+        self.next_id += 2
+        self._object(content, b"<< /Length %d >>\nstream\n" % len(stream) + stream + b"\nendstream")
+        self._object(page, b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+                           b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content)
+        self.pages.append(page)
+        self.lines = []
+
+    def close(self):
+        if self.lines or not self.pages:
+            self._flush_page()
+        kids = b" ".join(b"%d 0 R" % page for page in self.pages)
+        self._object(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(self.pages)))
+        xref = self.out.tell()
+        self._write(b"xref\n0 %d\n0000000000 65535 f \n" % self.next_id)
+        for number in range(1, self.next_id):
+            self._write(b"%010d 00000 n \n" % self.offsets[number])
+        self._write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (self.next_id, xref))
+
+
+def _rows(account_id, start, end, archived=False):
+    """Ledger legs for the account in the period, oldest first, with their transaction details.
+
+    With ``archived``, legs from ``ArchivedLedgerEntry`` are merged in (a month
+    being archived can be split across both tables).
+    """
+    def legs(model):
+        return (model.objects
+                .filter(book=LedgerEntry.ACCOUNT, account_id=account_id,
+                        created_at__gte=_aware(start), created_at__lt=_aware(end))
+                .order_by('created_at', 'id')
+                .values_list('id', 'created_at', 'amount', 'transaction_id', 'transaction__type',
+                             'transaction__amount', 'transaction__fee', 'transaction__note',
+                             'transaction__from_account__user__username', 'transaction__to_account__user__username')
+                .iterator(chunk_size=settings.REPORT_CHUNK_SIZE))
+
+    if not archived:
+        return legs(LedgerEntry)
+    return heapq.merge(legs(ArchivedLedgerEntry), legs(LedgerEntry), key=lambda row: (row[1], row[0]))
+
+
+def _write_statement(account_id, username, start, end, opening, existing, archived=False):
+    """Stream one statement to CSV and PDF; returns the saved ``Statement``."""
+    directory = _period_dir(start, end)
+    balance = opening
+    total_in = total_out = fees = ZERO
+    count, last_id = 0, None
+    with tempfile.SpooledTemporaryFile(max_size=1 << 20) as csv_file, \
+            tempfile.SpooledTemporaryFile(max_size=1 << 20) as pdf_file:
+        text = io.TextIOWrapper(csv_file, encoding='utf-8', newline='')
+        writer = csv.writer(text)
+        pdf = _PdfWriter(pdf_file)
+        title = f"FriendsBank statement: {username}, {start} to {end}"
+        pdf.line(title)
+        pdf.line()
+        pdf.line(f"{'Date':<17}{'Type':<9}{'Counterparty':<16}{'Amount':>12}{'Fee':>9}{'Change':>12}{'Balance':>13}")
+        writer.writerow(HEADER)
+        writer.writerow([start, '', 'opening', '', '', '', '', '', opening])
+        pdf.line(f"{str(start):<17}{'opening':<54}{opening:>13}")
+
+        for entry_id, created_at, change, tx_id, kind, amount, fee, note, from_user, to_user in _rows(
+                account_id, start, end, archived):
+            # The account pays the fee on what it sends or withdraws, and on its deposits.
+            fee = fee if change < 0 or kind == Transaction.DEPOSIT else ZERO
+            counterparty = (from_user if change > 0 else to_user) if kind == Transaction.TRANSFER else 'cash'
+            balance += change
+            if change > 0:
+                total_in += change
+            else:
+                total_out -= change
+            fees += fee
+            count += 1
+            if last_id is None or entry_id > last_id:
+                last_id = entry_id
+            when = timezone.localtime(created_at)
+            writer.writerow([when.strftime('%Y-%m-%d %H:%M:%S'), tx_id, kind, counterparty or '', note,
+                             amount, fee, change, balance])
+            pdf.line(f"{when:%Y-%m-%d %H:%M} {kind:<9}{(counterparty or '')[:15]:<16}{amount:>12}{fee:>9}"
+                     f"{change:>+12}{balance:>13}")
+
+        writer.writerow([end, '', 'closing', '', '', '', '', '', balance])
+        pdf.line(f"{str(end):<17}{'closing':<54}{balance:>13}")
+        pdf.line()
+        pdf.line(f"In: Rs.{total_in}   Out: Rs.{total_out}   Fees: Rs.{fees}   Entries: {count}")
+        pdf.close()
+        text.flush()
+        text.detach()
+
+        csv_file.seek(0)
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: csv_file.read(1 << 16), b''):
+            digest.update(chunk)
+        csv_file.seek(0)
+        pdf_file.seek(0)
+        csv_path = replace_stored_file(existing.csv_path if existing else None, f"{directory}/{account_id}.csv",
+                                       File(csv_file))
+        pdf_path = replace_stored_file(existing.pdf_path if existing else None, f"{directory}/{account_id}.pdf",
+                                       File(pdf_file))
+
+    statement, _ = Statement.objects.update_or_create(
+        account_id=account_id, period_start=start, period_end=end,
+        defaults=dict(opening_balance=opening, closing_balance=balance, total_in=total_in, total_out=total_out,
+                      total_fees=fees, entry_count=count, last_entry_id=last_id, csv_path=csv_path,
+                      pdf_path=pdf_path, csv_sha256=digest.hexdigest(), generated_at=timezone.now()),
+    )
+    return statement
+
+
+def _generate_batch(start, end, account_ids, force=False):
+    """Bring the statements of ``account_ids`` up to date; returns ``(generated, unchanged)``."""
+    horizon = ArchiveMonth.objects.horizon()
+    archived = horizon is not None and _aware(start) < horizon
+    # Archived entries all predate the horizon: history needs them whenever the
+    # archive is non-empty, period activity only when the period starts before it.
+    sources = [LedgerEntry] if horizon is None else [ArchivedLedgerEntry, LedgerEntry]
+    previous = dict(Statement.objects.filter(account_id__in=account_ids, period_end=start)
+                    .values_list('account_id', 'closing_balance'))
+    missing = [account_id for account_id in account_ids if account_id not in previous]
+    history, activity = {}, {}
+    for model in sources:
+        entries = model.objects.filter(book=LedgerEntry.ACCOUNT, account_id__in=account_ids)
+        for account_id, total in (entries.filter(account_id__in=missing, created_at__lt=_aware(start)).order_by()
+                                  .values('account_id').annotate(total=Sum('amount'))
+                                  .values_list('account_id', 'total')):
+            history[account_id] = history.get(account_id, ZERO) + total
+        if model is ArchivedLedgerEntry and not archived:
+            continue
+        for account_id, n, last in (entries.filter(created_at__gte=_aware(start), created_at__lt=_aware(end))
+                                    .order_by().values('account_id').annotate(n=Count('id'), last=Max('id'))
+                                    .values_list('account_id', 'n', 'last')):
+            count, last_id = activity.get(account_id, (0, None))
+            activity[account_id] = (count + n, max(last, last_id or 0))
+    existing = {s.account_id: s for s in Statement.objects.filter(
+        account_id__in=account_ids, period_start=start, period_end=end)}
+    usernames = dict(Account.objects.filter(id__in=account_ids).values_list('id', 'user__username'))
+
+    generated = unchanged = 0
+    for account_id in account_ids:
+        opening = previous.get(account_id, history.get(account_id) or ZERO)
+        count, last_id = activity.get(account_id, (0, None))
+        current = existing.get(account_id)
+        if (not force and current is not None and current.opening_balance == opening
+                and current.entry_count == count and current.last_entry_id == last_id):
+            unchanged += 1
+            continue
+        _write_statement(account_id, usernames.get(account_id, ''), start, end, opening, current, archived)
+        generated += 1
+    return generated, unchanged
+
+
+def _batches(end, batch_size):
+    batch = []
+    accounts = Account.objects.filter(user__date_joined__lt=_aware(end)).order_by('id')
+    for account_id in accounts.values_list('id', flat=True).iterator(chunk_size=batch_size):
+        batch.append(account_id)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def write_manifest(start, end):
+    """(Re)write the period's manifest CSV from its statements; returns its storage path."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(MANIFEST_HEADER)
+    rows = (Statement.objects.filter(period_start=start, period_end=end).order_by('account_id')
+            .values_list('account_id', 'account__user__username', 'opening_balance', 'total_in', 'total_out',
+                         'total_fees', 'closing_balance', 'entry_count', 'csv_path', 'pdf_path', 'csv_sha256',
+                         'generated_at')
+            .iterator(chunk_size=settings.REPORT_CHUNK_SIZE))
+    for row in rows:
+        writer.writerow(row[:-1] + (row[-1].isoformat(),))
+    name = f"{_period_dir(start, end)}/manifest.csv"
+    return replace_stored_file(name, name, ContentFile(buffer.getvalue().encode()))
+
+
+def generate(start, end, workers=None, batch_size=None, force=False, progress=None):
+    """Generate every account's statement for ``[start, end)``.
+
+    Returns ``{'generated', 'unchanged', 'manifest'}``; ``progress`` is called
+    with the running counts after each batch.
+    """
+    workers = workers or settings.STATEMENT_WORKERS
+    batch_size = batch_size or settings.STATEMENT_BATCH_SIZE
+    counts = {'generated': 0, 'unchanged': 0}
+    batches = list(_batches(end, batch_size))  # account ids only
+
+    def add(result):
+        counts['generated'] += result[0]
+        counts['unchanged'] += result[1]
+        if progress is not None:
+            progress(dict(counts))
+
+    if workers <= 1 or len(batches) <= 1:
+        for batch in batches:
+            add(_generate_batch(start, end, batch, force))
+    else:
+        # Forked workers must open their own connections, not share the parent's.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=_context) as pool:
+            for result in pool.map(_generate_batch, repeat(start), repeat(end), batches, repeat(force)):
+                add(result)
+    counts['manifest'] = write_manifest(start, end)
+    return counts
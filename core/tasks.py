@@ -0,0 +1,107 @@
+"""Background job handlers (see ``core.jobs``).
+
+Each handler takes the job's JSON payload and returns a JSON-serialisable
+result, which the admin job page shows. Raising marks the attempt failed
+and schedules a retry.
+"""
+import csv
+import io
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from . import ledger, provisioning, reports, statements
+from .jobs import enqueue_many, task
+from .models import Account
+from .utils import ensure_account_qr, pay_path, qr_filename
+
+REPORTS_DIR = 'reports'
+IMPORTS_DIR = 'imports'
+
+
+@task('withdrawals.approve')
+def approve_withdrawals(payload):
+    """Approve the pending withdrawals in ``ids`` as one ledger batch; returns per-request outcomes."""
+    results = ledger.bulk_approve_withdrawals(payload['ids'])
+    return {r['id']: 'approved' if r['ok'] else r['error'] for r in results}
+
+
+@task('reports.profit_csv')
+def export_profit_report(payload):
+    """Write a profit report CSV to storage under ``reports/`` and return its path."""
+    start = reports.parse_day(payload.get('from'))
+    end = reports.parse_day(payload.get('to'))
+    tx_type = payload.get('type') or None
+    if payload.get('summary') == 'daily':
+        header, rows = reports.SUMMARY_HEADER, reports.daily_summary_rows(start, end, tx_type)
+    else:
+        header, rows = reports.PROFIT_HEADER, reports.profit_rows(start, end, tx_type)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(header)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    name = f"{REPORTS_DIR}/profit_{timezone.localtime():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:8]}.csv"
+    path = default_storage.save(name, ContentFile(buffer.getvalue().encode()))
+    return {'path': path, 'rows': count}
+
+
+@task('qr.generate')
+def generate_qr(payload):
+    done = 0
+    for account in Account.objects.filter(id__in=payload['account_ids']).only('id', 'user_id', 'qr_image'):
+        ensure_account_qr(account)
+        done += 1
+    return {'generated': done}
+
+
+@task('qr.backfill')
+def backfill_qr(payload):
+    """Fan out ``qr.generate`` jobs for every account without a current QR, so workers share them."""
+    batch_size = payload.get('batch_size', 200)
+    force = payload.get('force', False)
+    batches, batch = [], []
+    for account_id, current in Account.objects.order_by('id').values_list('id', 'qr_image').iterator(chunk_size=2000):
+        if not force and current == qr_filename(f"{settings.QR_BASE_URL}{pay_path(account_id)}"):
+            continue
+        batch.append(account_id)
+        if len(batch) == batch_size:
+            batches.append({'account_ids': batch})
+            batch = []
+    if batch:
+        batches.append({'account_ids': batch})
+    enqueue_many('qr.generate', batches)
+    return {'jobs': len(batches)}
+
+
+@task('users.import')
+def import_users(payload):
+    """Import the uploaded users CSV at ``path``, write a per-row report and delete the upload."""
+    counts = {provisioning.CREATED: 0, provisioning.SKIPPED: 0, provisioning.FAILED: 0}
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(provisioning.REPORT_HEADER)
+    with default_storage.open(payload['path'], 'rb') as f:
+        rows = provisioning.read_rows(io.TextIOWrapper(f, encoding='utf-8-sig', newline=''))
+        for r in provisioning.import_users(rows, render_qr=payload.get('qr', False)):
+            writer.writerow([r['row'], r['username'], r['status'], r['account_id'] or '', r['error']])
+            counts[r['status']] += 1
+    name = f"{REPORTS_DIR}/users_import_{timezone.localtime():%Y%m%d_%H%M%S}_{uuid.uuid4().hex[:8]}.csv"
+    path = default_storage.save(name, ContentFile(buffer.getvalue().encode()))
+    default_storage.delete(payload['path'])  # it holds plaintext passwords
+    return {'path': path, 'rows': sum(counts.values()), **counts}
+
+
+@task('statements.generate')
+def generate_statements(payload):
+    """Bring every account's statement for ``month`` (YYYY-MM) up to date and rewrite the manifest."""
+    start, end = statements.month_bounds(payload['month'])
+    result = statements.generate(start, end, force=payload.get('force', False))
+    return {'month': payload['month'], 'generated': result['generated'], 'unchanged': result['unchanged'],
+            'path': result['manifest']}
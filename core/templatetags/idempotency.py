@@ -0,0 +1,19 @@
+import uuid
+
+from django import template
+from django.utils.html import format_html
+
+from core.idempotency import FIELD
+
+register = template.Library()
+
+
+@register.simple_tag
+def idempotency_key():
+    return uuid.uuid4().hex
+
+
+@register.simple_tag
+def idempotency_field():
+    """Hidden input carrying a fresh server-issued idempotency key for this form render."""
+    return format_html('<input type="hidden" name="{}" value="{}">', FIELD, uuid.uuid4().hex)
@@ -0,0 +1,482 @@
+import os
+import time
+from unittest import skipUnless
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import OperationalError, connection
+from django.http import HttpResponse
+from django.test import Client, RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from . import archive, fees, idempotency, jobs, ledger, provisioning
+from .management.commands import bench, explain_hot_queries
+from .models import (
+    Account, ArchivedTransaction, FeeRule, FeeSchedule, IdempotencyKey, Job, MoneyRequest, Transaction,
+    WithdrawalRequest,
+)
+from .utils import parse_transfer_rows
+
+# Templates use {% static %}; the manifest storage needs collectstatic, which tests don't run.
+TEST_STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.InMemoryStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+class ParseTransferRowsTests(SimpleTestCase):
+    def test_csv_with_header(self):
+        rows = parse_transfer_rows("to_username,amount,note\nalice,10,rent\nbob,2.50\n")
+        self.assertEqual(rows, [('alice', '10', 'rent'), ('bob', '2.50', '')])
+
+    def test_json_lists_and_objects(self):
+        rows = parse_transfer_rows('[["alice", 10], {"to_username": "bob", "amount": "2.5", "note": "x"}]')
+        self.assertEqual(rows, [('alice', 10, ''), ('bob', '2.5', 'x')])
+
+    def test_json_cells_become_text(self):
+        self.assertEqual(parse_transfer_rows('[[42, 1, null]]'), [('42', 1, '')])
+
+    def test_json_rows_of_the_wrong_shape(self):
+        for data in ('[1, 2]', '["a"]', '[["alice", 1], 3]'):
+            with self.subTest(data=data), self.assertRaisesMessage(ValueError, "expected [username, amount] or object"):
+                parse_transfer_rows(data)
+
+
+@override_settings(STORAGES=TEST_STORAGES, PASSWORD_HASHERS=FAST_HASHERS)
+class BulkTransferViewTests(TestCase):
+    def setUp(self):
+        User.objects.create_user('alice', password='p')
+        self.client.login(username='alice', password='p')
+
+    def test_binary_upload_is_a_form_error(self):
+        upload = SimpleUploadedFile('rows.csv', b'\xff\xfe\x00bob,1\n\x89PNG')
+        response = self.client.post('/u/transfer/bulk/', {'file': upload})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "not UTF-8 text")
+        self.assertFalse(Transaction.objects.filter(type=Transaction.TRANSFER).exists())
+
+
+# One rollup shard, so every write after the first updates rows that already exist.
+@override_settings(STORAGES=TEST_STORAGES, PASSWORD_HASHERS=FAST_HASHERS, LEDGER_STATS_SHARDS=1)
+class QueryBudgetTests(TestCase):
+    """Each page costs a fixed number of queries, however many rows it lists."""
+
+    # Warm requests: session, user and account come from the cache.
+    BUDGETS = {
+        '/u/dashboard/': 0,  # every fragment cached
+        '/u/transactions/': 5,
+        '/u/api/transactions/': 5,
+        '/u/requests/': 2,
+    }
+    ADMIN_BUDGETS = {
+        '/u/admin-dashboard/': 4,
+        '/u/admin/withdrawals/': 3,
+    }
+
+    def setUp(self):
+        clear_caches()
+        self.alice = User.objects.create_user('alice', password='p')
+        self.bob = User.objects.create_user('bob', password='p')
+        User.objects.create_superuser('root', password='p')
+        ledger.deposit(self.alice.account, Decimal('1000'))
+        self.client.login(username='alice', password='p')
+        self.admin = Client()
+        self.admin.login(username='root', password='p')
+
+    def _grow(self, n):
+        for _ in range(n):
+            ledger.transfer(self.alice.account, self.bob.account, Decimal('1'))
+            WithdrawalRequest.objects.create(user=self.alice, amount=Decimal('1'))
+            MoneyRequest.objects.create(requester=self.bob.account, target=self.alice.account, amount=Decimal('1'))
+
+    def test_listing_budgets_do_not_grow_with_rows(self):
+        for n in (1, 20):
+            self._grow(n)
+            for client, budgets in ((self.client, self.BUDGETS), (self.admin, self.ADMIN_BUDGETS)):
+                for url, budget in budgets.items():
+                    client.get(url)  # warm the caches
+                    with self.subTest(rows=n, url=url), self.assertNumQueries(budget):
+                        self.assertEqual(client.get(url).status_code, 200)
+
+    def test_cold_dashboard(self):
+        # Session, account (with its user), today's transactions, pending withdrawals.
+        for n in (1, 20):
+            self._grow(n)
+            clear_caches()
+            with self.subTest(rows=n), self.assertNumQueries(4):
+                self.assertEqual(self.client.get('/u/dashboard/').status_code, 200)
+
+    def test_transfer_budget(self):
+        self.client.post('/u/transfer/', {'to_username': 'bob', 'amount': '2'})  # creates today's rollup rows
+        with self.assertNumQueries(12):
+            response = self.client.post('/u/transfer/', {'to_username': 'bob', 'amount': '2'})
+        self.assertEqual(response.status_code, 302)
+
+
+@override_settings(STORAGES=TEST_STORAGES, PASSWORD_HASHERS=FAST_HASHERS)
+class BenchmarkTests(TestCase):
+    """Small serial runs of the ``bench`` workloads, with asserted budgets.
+
+    Latency ceilings are loose enough for a slow CI box and catch
+    order-of-magnitude regressions; set ``BENCH_P95_MS`` to tighten them.
+    ``manage.py bench`` is the full concurrent run with a JSON report.
+    """
+    OPS = 30
+    P95_MS = float(os.environ.get('BENCH_P95_MS', 500))
+    # Mean queries per operation, including each client's first (cold) request.
+    QUERY_BUDGETS = {
+        'transfer': 18,
+        'approve_request': 20,
+        'withdraw_approve': 20,
+        'view_transactions': 6,
+        'view_dashboard': 3,
+        'view_admin_dashboard': 6,
+        'view_profit_report': 4,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.accounts = bench.Command()._seed(20, 500)
+        cls.admin = User.objects.create_superuser('bench_admin', password=None)
+
+    def setUp(self):
+        clear_caches()
+        self.bench = bench.Command()
+        self.bench.accounts, self.bench.admin = self.accounts, self.admin
+
+    def test_workloads(self):
+        for name in bench.WORKLOADS:
+            with self.subTest(workload=name):
+                result = self.bench._drive(name, self.OPS, concurrency=1)
+                self.assertEqual(result['errors'], 0, result['error_samples'])
+                self.assertEqual(result['ops'], self.OPS)
+                self.assertLessEqual(result['queries_per_op'], self.QUERY_BUDGETS[name])
+                self.assertLessEqual(result['p95_ms'], self.P95_MS)
+        self.assertTrue(self.bench._conservation()['ok'])
+
+
+@override_settings(STORAGES=TEST_STORAGES, PASSWORD_HASHERS=FAST_HASHERS, IDEMPOTENCY_WAIT=0)
+class IdempotencyTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.alice = User.objects.create_user('alice', password='p')
+        User.objects.create_user('bob', password='p')
+        ledger.deposit(self.alice.account, Decimal('100'))
+        self.client.login(username='alice', password='p')
+
+    def _transfer(self, key):
+        return self.client.post('/u/transfer/', {'to_username': 'bob', 'amount': '5'}, headers={'Idempotency-Key': key})
+
+    def _transfers(self):
+        return Transaction.objects.filter(type=Transaction.TRANSFER).count()
+
+    def test_duplicate_replays_the_stored_response(self):
+        first, second = self._transfer('k1'), self._transfer('k1')
+        self.assertEqual((first.status_code, second.status_code), (302, 302))
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(self._transfers(), 1)
+
+    def test_claim_of_a_dead_worker_lapses(self):
+        # A worker claimed the key and died before running the view.
+        request = RequestFactory().post('/u/transfer/', {'to_username': 'bob', 'amount': '5'})
+        request.user = self.alice
+        idempotency._claim(request, 'k2', idempotency._fingerprint(request))
+
+        self.assertEqual(self._transfer('k2').status_code, 409)  # still within its lease
+        IdempotencyKey.objects.update(renewed_at=IdempotencyKey.objects.get().renewed_at - timedelta(
+            seconds=settings.IDEMPOTENCY_LEASE + 1))
+        self.assertEqual(self._transfer('k2').status_code, 302)
+        self.assertEqual(self._transfers(), 1)
+        self.assertEqual(IdempotencyKey.objects.get().status, IdempotencyKey.DONE)
+
+    def test_view_runs_outside_the_key_bookkeeping_transaction(self):
+        depth = {}
+
+        @idempotency.idempotent
+        def view(request):
+            depth['inside'] = len(connection.atomic_blocks)
+            return HttpResponse('ok')
+
+        request = RequestFactory().post('/x/', {'a': '1'}, headers={'Idempotency-Key': 'k3'})
+        request.user = self.alice
+        outside = len(connection.atomic_blocks)
+        self.assertEqual(view(request).status_code, 200)
+        self.assertEqual(depth['inside'], outside)
+
+
+# The heartbeat renews the claim from its own thread (and connection), so the key row must be committed.
+@override_settings(IDEMPOTENCY_LEASE=0.3, IDEMPOTENCY_HEARTBEAT=0.05, IDEMPOTENCY_WAIT=0)
+class IdempotencyLeaseTests(TransactionTestCase):
+    def _request(self, user):
+        request = RequestFactory().post('/x/', {'a': '1'}, headers={'Idempotency-Key': 'k'})
+        request.user = user
+        return request
+
+    def test_running_request_keeps_its_claim(self):
+        user = User.objects.create_user('slow')
+        retries = []
+
+        @idempotency.idempotent
+        def view(request):
+            time.sleep(0.6)  # twice the lease
+            retry = self._request(user)
+            retries.append(idempotency._claim(retry, 'k', idempotency._fingerprint(retry))[0])
+            return HttpResponse('ok')
+
+        self.assertEqual(view(self._request(user)).status_code, 200)
+        self.assertEqual(retries, [None])  # the retry found the claim still held
+        self.assertEqual(IdempotencyKey.objects.get().status, IdempotencyKey.DONE)
+
+
+class QueryPlanTests(TestCase):
+    """The hot queries must be served by their indexes, never a full table scan."""
+    INDEXES = {
+        'admin withdrawal queue': 'withdrawal_pending_idx',
+        'user pending withdrawals': 'withdrawal_user_pending_idx',
+        'processed withdrawals': 'withdrawal_status_created_idx',
+        'pending money requests': 'moneyreq_pending_idx',
+        'incoming requests': 'moneyreq_target_created_idx',
+        'outgoing requests': 'moneyreq_requester_created_idx',
+        'dashboard recent': 'tx_from_created_idx',
+        'admin recent transactions': 'tx_created_idx',
+        'transactions by day': 'tx_created_idx',
+        'profit report range': 'profit_created_idx',
+    }
+    INDEX_ACCESS = r'USING (COVERING )?INDEX|USING INTEGER PRIMARY KEY|Index (Only )?Scan'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = User.objects.create_user('alice').account
+
+    def assertUsesIndex(self, queryset, index=None):
+        plan = explain_hot_queries.Command()._explain(queryset, 'default', connection.vendor)
+        full_scan = explain_hot_queries.FULL_SCAN.get(connection.vendor)
+        if full_scan is not None:
+            self.assertFalse(full_scan.findall(plan), plan)
+        self.assertRegex(plan, self.INDEX_ACCESS)
+        if index:
+            self.assertIn(index, plan)
+
+    def test_admin_queues_dashboards_and_reports(self):
+        queries = explain_hot_queries.hot_queries(self.account)
+        self.assertEqual(set(queries), set(self.INDEXES))
+        for name, queryset in queries.items():
+            with self.subTest(query=name):
+                self.assertUsesIndex(queryset, self.INDEXES[name])
+
+    def test_history_legs(self):
+        for before in (None, (timezone.now(), 10)):
+            union, legs = Transaction.objects.all()._history_legs(self.account, before, 50)
+            for queryset, index in zip(legs or [union] * 2, ('tx_from_created_idx', 'tx_to_created_idx')):
+                with self.subTest(before=before, index=index):
+                    self.assertUsesIndex(queryset, index)
+
+    def test_recipient_lookup(self):
+        self.assertUsesIndex(Account.objects.filter(user__username='alice').values_list('id', 'user_id'))
+
+    @skipUnless(connection.vendor == 'postgresql', "prefix search only queries the database on PostgreSQL")
+    def test_recipient_prefix_search(self):
+        # The prefix path is Postgres-only (core.lookup.search); elsewhere it is served from memory.
+        self.assertUsesIndex(Account.objects.filter(user__username__startswith='al')
+                             .order_by('user__username').values_list('user__username', 'id')[:10])
+
+
+class SerializationFailure(Exception):
+    sqlstate = '40001'
+
+
+# retry_on_conflict only retries an outermost transaction.
+@override_settings(LEDGER_RETRY_BACKOFF=0)
+class RetryOnConflictTests(TransactionTestCase):
+    def _failing(self, times, cause):
+        calls = []
+
+        @ledger.retry_on_conflict
+        def write():
+            calls.append(1)
+            if len(calls) <= times:
+                raise OperationalError('could not serialize access') from cause
+            return 'ok'
+        return write, calls
+
+    def test_serialization_failure_is_retried(self):
+        write, calls = self._failing(1, SerializationFailure())
+        self.assertEqual(write(), 'ok')
+        self.assertEqual(len(calls), 2)
+
+    def test_other_errors_are_not_retried(self):
+        write, calls = self._failing(1, Exception())
+        with self.assertRaises(OperationalError):
+            write()
+        self.assertEqual(len(calls), 1)
+
+
+# The heartbeat renews the lease from its own thread (and connection), so the job row must be committed.
+@override_settings(JOB_LEASE=0.3, JOB_HEARTBEAT=0.05)
+class JobLeaseTests(TransactionTestCase):
+    def test_running_job_keeps_its_lease(self):
+        requeued = []
+
+        @jobs.task('test.slow')
+        def slow(payload):
+            time.sleep(0.6)  # twice the lease
+            requeued.append(jobs.requeue_stale())
+            return 'done'
+
+        self.addCleanup(jobs._registry.pop, 'test.slow')
+        job = jobs.enqueue('test.slow')
+        self.assertEqual(jobs.work('test-worker'), 1)
+        self.assertEqual(requeued, [0])
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.result), (Job.DONE, 1, 'done'))
+
+    def test_job_requeued_while_waiting_in_a_batch_is_skipped(self):
+        ran = []
+
+        @jobs.task('test.first')
+        def first(payload):
+            time.sleep(0.4)  # the second job's lease runs out while it waits
+            ran.append('first')
+            jobs.requeue_stale()
+            jobs.claim('other-worker')
+
+        jobs.task('test.second')(lambda payload: ran.append('second'))
+        self.addCleanup(jobs._registry.pop, 'test.first')
+        self.addCleanup(jobs._registry.pop, 'test.second')
+        jobs.enqueue('test.first', priority=1)
+        second = jobs.enqueue('test.second')
+        self.assertEqual(jobs.work('test-worker', batch_size=2), 2)
+        self.assertEqual(ran, ['first'])
+        second.refresh_from_db()
+        self.assertEqual((second.status, second.locked_by, second.attempts), (Job.RUNNING, 'other-worker', 0))
+
+    def test_dead_worker_is_requeued(self):
+        jobs.task('test.noop')(lambda payload: None)
+        self.addCleanup(jobs._registry.pop, 'test.noop')
+        job = jobs.enqueue('test.noop')
+        jobs.claim('dead-worker')
+        time.sleep(0.4)
+        self.assertEqual(jobs.requeue_stale(), 1)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.QUEUED)
+
+
+@override_settings(STORAGES=TEST_STORAGES, PASSWORD_HASHERS=FAST_HASHERS)
+class FeeScheduleAdminTests(TestCase):
+    def setUp(self):
+        User.objects.create_superuser('root', password='p')
+        self.client.login(username='root', password='p')
+
+    def _schedule(self, active=False):
+        schedule = FeeSchedule.objects.create(name='test', active=active)
+        FeeRule.objects.create(schedule=schedule, type=Transaction.TRANSFER, percent=Decimal('1'))
+        return schedule
+
+    def _rules_editable(self, schedule):
+        response = self.client.get(f'/admin/core/feeschedule/{schedule.id}/change/')
+        self.assertEqual(response.status_code, 200)
+        return 'name="rules-0-percent"' in response.content.decode()
+
+    def _post_percent(self, schedule, percent):
+        rule = schedule.rules.get()
+        self.client.post(f'/admin/core/feeschedule/{schedule.id}/change/', {
+            'name': schedule.name, 'note': '', 'created_at_0': '2026-01-01', 'created_at_1': '00:00:00',
+            'active': 'on' if schedule.active else '',
+            'rules-TOTAL_FORMS': '1', 'rules-INITIAL_FORMS': '1', 'rules-MIN_NUM_FORMS': '0', 'rules-MAX_NUM_FORMS': '1000',
+            'rules-0-id': rule.id, 'rules-0-schedule': schedule.id, 'rules-0-type': rule.type,
+            'rules-0-min_amount': '0', 'rules-0-percent': percent, 'rules-0-flat': '0',
+        })
+        rule.refresh_from_db()
+        return rule.percent
+
+    def test_draft_schedule_rules_are_editable(self):
+        schedule = self._schedule()
+        self.assertTrue(self._rules_editable(schedule))
+        self.assertEqual(self._post_percent(schedule, '9'), Decimal('9'))
+
+    def test_active_schedule_rules_are_read_only(self):
+        self.assertFalse(self._rules_editable(self._schedule(active=True)))
+
+    def test_used_schedule_rules_are_read_only(self):
+        schedule = self._schedule()
+        Transaction.objects.create(type=Transaction.DEPOSIT, amount=Decimal('1'), fee_schedule=schedule)
+        self.assertFalse(self._rules_editable(schedule))
+        self.assertEqual(self._post_percent(schedule, '9'), Decimal('1'))
+
+
+class HistoryArchiveTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.account = User.objects.create_user('hist').account
+        old = timezone.now() - timedelta(days=settings.ARCHIVE_RETENTION_DAYS + 62)
+        for days in (1, 0):
+            Transaction.objects.create(to_account=cls.account, type=Transaction.DEPOSIT, amount=Decimal('1'),
+                                       created_at=old - timedelta(days=days))
+        archive.archive_month(timezone.localdate(old).replace(day=1))
+        for _ in range(3):
+            Transaction.objects.create(to_account=cls.account, type=Transaction.DEPOSIT, amount=Decimal('1'))
+        cls.archived = sorted(ArchivedTransaction.objects.values_list('id', flat=True), reverse=True)
+        cls.hot = sorted(Transaction.objects.values_list('id', flat=True), reverse=True)
+
+    def test_full_hot_page_continues_into_archive(self):
+        rows, next_key = Transaction.objects.history(self.account, limit=3)
+        self.assertEqual([row.id for row in rows], self.hot)
+        self.assertIsNotNone(next_key)
+        rows, next_key = Transaction.objects.history(self.account, before=next_key, limit=3)
+        self.assertEqual([row.id for row in rows], self.archived)
+        self.assertIsNone(next_key)
+
+    async def test_full_hot_page_continues_into_archive_async(self):
+        rows, next_key = await Transaction.objects.ahistory(self.account, limit=3)
+        self.assertEqual([row.id for row in rows], self.hot)
+        rows, next_key = await Transaction.objects.ahistory(self.account, before=next_key, limit=3)
+        self.assertEqual([row.id for row in rows], self.archived)
+
+
+@override_settings(STORAGES=TEST_STORAGES, PASSWORD_HASHERS=FAST_HASHERS)
+class DepositFeeTests(TestCase):
+    def setUp(self):
+        schedule = FeeSchedule.objects.create(name='minimum', active=True)
+        FeeRule.objects.create(schedule=schedule, type=Transaction.DEPOSIT, percent=Decimal('1'),
+                               minimum_fee=Decimal('5'))
+        # Rule saves invalidate on commit, which never comes inside a TestCase.
+        fees.invalidate()
+        self.addCleanup(fees.invalidate)
+        self.account = User.objects.create_user('small').account
+
+    def test_deposit_below_minimum_fee_is_refused(self):
+        ledger.deposit(self.account, Decimal('10'))
+        with self.assertRaisesMessage(ValueError, "does not cover its Rs.5.00 fee"):
+            ledger.deposit(self.account, Decimal('2'))
+        self.account.refresh_from_db()
+        self.assertEqual(self.account.balance, Decimal('5'))
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_bulk_deposit_below_minimum_fee_is_refused(self):
+        with self.assertRaises(ValueError):
+            ledger.bulk_deposit([(self.account.id, Decimal('10')), (self.account.id, Decimal('5'))])
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_admin_deposit_reports_the_error(self):
+        User.objects.create_superuser('root', password='p')
+        self.client.login(username='root', password='p')
+        response = self.client.post('/u/admin/deposit/', {'username': 'small', 'amount': '2', 'note': ''}, follow=True)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "does not cover its Rs.5.00 fee")
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_import_fails_the_row(self):
+        rows = provisioning.read_rows(['username,opening_balance', 'tiny,2', 'big,10'])
+        results = list(provisioning.import_users(rows, workers=1))
+        self.assertEqual([r['status'] for r in results], [provisioning.FAILED, provisioning.CREATED])
+        self.assertIn("does not cover", results[0]['error'])
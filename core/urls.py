@@ -9,22 +9,39 @@ urlpatterns = [
     path('qr/', views.view_qr, name='view_qr'),
     path('scan/', views.scan_qr, name='scan_qr'),
     path('transfer/', views.transfer, name='transfer'),
+    path('transfer/bulk/', views.bulk_transfer, name='bulk_transfer'),
     path('profit-report.csv', views.profit_report_csv, name='profit_report_csv'),
 
     # Withdraw is a request for admin approval
     path('withdraw/', views.withdraw, name='withdraw'),
     path('user/', views.user, name='user'),
     path('transactions/', views.transactions, name='transactions'),
+    path('api/transactions/', views.transactions_api, name='transactions_api'),
+    path('api/recipients/', views.recipients_api, name='recipients_api'),
+    path('statements/', views.statements_view, name='statements'),
+    path('statements/<int:statement_id>/<str:fmt>/', views.statement_download, name='statement_download'),
     path('requests/', views.requests_view, name='requests'),
+    path('requests/bulk/', views.requests_bulk, name='requests_bulk'),
     path('requests/<int:req_id>/approve/', views.approve_request, name='approve_request'),
     path('requests/<int:req_id>/reject/', views.reject_request, name='reject_request'),
     path('admin/users/', views.admin_users, name='admin_users'),
     path('admin/users/<int:user_id>/delete/', views.admin_delete_user, name='admin_delete_user'),
     # Admin-only operations
     path('admin/deposit/', views.admin_deposit, name='admin_deposit'),
+    path('admin/cache-stats/', views.admin_cache_stats, name='admin_cache_stats'),
     path('admin/withdrawals/', views.admin_withdrawals, name='admin_withdrawals'),
     path('admin/withdrawals/<int:wid>/approve/', views.admin_withdraw_approve, name='admin_withdraw_approve'),
     path('admin/withdrawals/<int:wid>/reject/', views.admin_withdraw_reject, name='admin_withdraw_reject'),
+    path('admin/withdrawals/bulk/', views.admin_withdrawals_bulk, name='admin_withdrawals_bulk'),
+    path('admin/withdrawals/enqueue/', views.admin_withdrawals_enqueue, name='admin_withdrawals_enqueue'),
     path('admin/users/add/', views.admin_add_user, name='admin_add_user'),
+    path('admin/users/import/', views.admin_users_import, name='admin_users_import'),
+    # Background jobs
+    path('admin/jobs/', views.admin_jobs, name='admin_jobs'),
+    path('admin/jobs/<int:job_id>/retry/', views.admin_job_retry, name='admin_job_retry'),
+    path('admin/jobs/<int:job_id>/download/', views.admin_job_download, name='admin_job_download'),
+    path('admin/reports/enqueue/', views.admin_report_enqueue, name='admin_report_enqueue'),
+    path('admin/qr/backfill/', views.admin_qr_backfill, name='admin_qr_backfill'),
+    path('admin/statements/enqueue/', views.admin_statements_enqueue, name='admin_statements_enqueue'),
 
 ]
@@ -1,11 +1,119 @@
+import base64
+import csv
+import io
+import json
+from datetime import datetime
+from functools import lru_cache
+from hashlib import sha256
 from io import BytesIO
 import qrcode
+import qrcode.image.svg
 from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
 from django.conf import settings
 
-def generate_qr_image(path_suffix: str):
-    url = f"{settings.QR_BASE_URL}{path_suffix}"
+def pay_path(account_id):
+    return f"/account/{account_id}/pay/"
+
+def render_qr_png(url: str) -> bytes:
     img = qrcode.make(url)
     bio = BytesIO()
     img.save(bio, format='PNG')
-    return ContentFile(bio.getvalue(), name='qr.png')
+    return bio.getvalue()
+
+def qr_filename(url: str):
+    """Content-addressed storage name: the same URL always maps to the same file."""
+    return f"qrcodes/{sha256(url.encode()).hexdigest()[:24]}.png"
+
+def generate_qr_image(path_suffix: str):
+    url = f"{settings.QR_BASE_URL}{path_suffix}"
+    return ContentFile(render_qr_png(url), name=qr_filename(url).rsplit('/', 1)[1])
+
+def store_qr_png(url: str, png: bytes = None):
+    """Write the QR for ``url`` to storage unless it is already there; returns the name."""
+    name = qr_filename(url)
+    if not default_storage.exists(name):
+        saved = default_storage.save(name, ContentFile(png if png is not None else render_qr_png(url)))
+        if saved != name:
+            # Lost a race with another writer; the file we wanted exists now.
+            default_storage.delete(saved)
+    return name
+
+def replace_stored_file(path, name, f):
+    """Delete the file at ``path`` (if any) and save ``f`` as ``name``; returns the saved name."""
+    if path and default_storage.exists(path):
+        default_storage.delete(path)
+    return default_storage.save(name, f)
+
+def ensure_account_qr(account):
+    """Point ``account.qr_image`` at its current content-addressed QR, rendering it if missing."""
+    from . import caching
+    from .models import Account
+    url = f"{settings.QR_BASE_URL}{pay_path(account.id)}"
+    if account.qr_image and account.qr_image.name == qr_filename(url):
+        return account.qr_image
+    account.qr_image.name = store_qr_png(url)
+    Account.objects.filter(id=account.id).update(qr_image=account.qr_image.name)
+    caching.invalidate(account.user_id)  # request.account is cached (core.auth)
+    return account.qr_image
+
+@lru_cache(maxsize=4096)
+def _qr_svg(account_id, base_url):
+    img = qrcode.make(f"{base_url}{pay_path(account_id)}", image_factory=qrcode.image.svg.SvgPathImage)
+    return img.to_string(encoding='unicode')
+
+def qr_svg(account_id):
+    """Inline SVG markup for an account's pay QR, cached in-process per (account, base URL)."""
+    return _qr_svg(account_id, settings.QR_BASE_URL)
+
+def parse_transfer_rows(data: str):
+    """Parse a bulk transfer payload into ``(to_username, amount, note)`` rows.
+
+    Accepts a JSON list (of objects or ``[username, amount, note]`` lists) or
+    CSV with an optional ``to_username,amount,note`` header line.
+    """
+    data = data.lstrip('\ufeff').strip()
+    if not data:
+        return []
+    if data[0] in '[{':
+        items = json.loads(data)
+        if isinstance(items, dict):
+            items = [items]
+        rows = []
+        for i, item in enumerate(items, start=1):
+            if isinstance(item, dict):
+                item = [item.get('to_username'), item.get('amount', ''), item.get('note')]
+            elif not isinstance(item, list):
+                raise ValueError(f"row {i}: expected [username, amount] or object")
+            item = item + ['', '', '']
+            # Usernames and notes must be text; amounts may be JSON numbers.
+            rows.append(('' if item[0] is None else str(item[0]), item[1], '' if item[2] is None else str(item[2])))
+        return rows
+    reader = csv.reader(io.StringIO(data))
+    rows = []
+    for line in reader:
+        if not line or not any(cell.strip() for cell in line):
+            continue
+        line = line + ['', '', '']
+        if not rows and line[0].strip().lower() in ('to_username', 'username'):
+            continue
+        rows.append((line[0], line[1], line[2]))
+    return rows
+
+def encode_cursor(key):
+    """Opaque URL-safe cursor for a ``(created_at, id)`` keyset position."""
+    created_at, pk = key
+    raw = f"{created_at.isoformat()}|{pk}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.split('|')
+        created_at = datetime.fromisoformat(created_at)
+        pk = int(pk)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor.")
+    if created_at.tzinfo is None:
+        raise ValueError("Invalid cursor.")
+    return created_at, pk
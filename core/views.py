@@ -4,15 +4,25 @@ from django.contrib import messages
 from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib.auth.models import User
-from django.db import transaction, models
-from django.http import HttpResponse, HttpResponseForbidden
-from django.shortcuts import get_object_or_404, redirect, render
+from django.db import models
+from django.db.models import ProtectedError
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from asgiref.sync import sync_to_async
+from django.shortcuts import aget_object_or_404, get_object_or_404, redirect, render
 from django.utils import timezone
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import condition
+from datetime import datetime, time
 import csv
 
-from .models import Account, Transaction, ProfitRecord, MoneyRequest, WithdrawalRequest
-from .forms import TransferForm, WithdrawForm, RequestMoneyForm, AdminUserForm, AdminDepositForm
-from .utils import generate_qr_image
+from .models import Account, Job, Statement, Transaction, MoneyRequest, WithdrawalRequest
+from .forms import TransferForm, WithdrawForm, RequestMoneyForm, AdminUserForm, AdminDepositForm, BulkTransferForm, UserImportForm
+from .utils import ensure_account_qr, pay_path, qr_svg, parse_transfer_rows, encode_cursor, decode_cursor
+from . import caching, fees, jobs, ledger, lookup, reports, rollups, statements, tasks
+from .aio import arender, run_write
+from .dbrouting import read_from_replica, replica_alias
+from .idempotency import idempotent
 
 def is_admin(user):
     return user.is_superuser
@@ -25,11 +35,7 @@ def home(request):
     if request.user.is_authenticated:
         return redirect('dashboard')
     return redirect('login')
-    
-from django.contrib.auth.decorators import login_required
-from django.contrib.auth.models import User
-from django.shortcuts import render, redirect
-from django.contrib import messages
+
 
 @login_required
 def admin_add_user(request):
@@ -77,26 +83,58 @@ def admin_users(request):
         messages.success(request, f"User {username} created successfully.")
         return redirect('admin_users')
 
-    return render(request, 'core/admin_add_user.html')
+    return render(request, 'core/admin_add_user.html', {'import_form': UserImportForm()})
 
+@user_passes_test(is_admin)
+def admin_users_import(request):
+    if request.method != 'POST':
+        return redirect('admin_users')
+    form = UserImportForm(request.POST, request.FILES)
+    if not form.is_valid():
+        messages.error(request, "Choose a CSV file to import.")
+        return redirect('admin_users')
+    # The file goes to storage and a worker imports it; hashing thousands of passwords takes minutes.
+    name = f"{tasks.IMPORTS_DIR}/users_{timezone.localtime():%Y%m%d_%H%M%S}.csv"
+    path = default_storage.save(name, form.cleaned_data['file'])
+    jobs.enqueue('users.import', {'path': path, 'qr': form.cleaned_data['qr']}, user=request.user)
+    messages.success(request, "Import queued; its report appears here when it is done.")
+    return redirect('admin_jobs')
 
 
 
-def profit_report_csv(request):
-    # Create the HTTP response with CSV content type
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = 'attachment; filename="profit_report.csv"'
 
-    writer = csv.writer(response)
-    writer.writerow(['Date', 'User', 'Profit'])
+class Echo:
+    """File-like object whose write() hands the row back, for streaming csv.writer output."""
+    def write(self, value):
+        return value
 
-    # Example: loop through transactions and calculate profit
-    transactions = Transaction.objects.all()
-    for t in transactions:
-        writer.writerow([t.date, t.user.username, t.profit])
+def _csv_response(header, rows, filename):
+    def stream():
+        writer = csv.writer(Echo())
+        yield writer.writerow(header)
+        for row in rows:
+            yield writer.writerow(row)
 
+    response = StreamingHttpResponse(stream(), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
     return response
 
+@user_passes_test(is_admin)
+@read_from_replica
+def profit_report_csv(request):
+    try:
+        start = reports.parse_day(request.GET.get('from'))
+        end = reports.parse_day(request.GET.get('to'))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    tx_type = request.GET.get('type')
+    # Bind the alias now: the stream is consumed after the view (and its replica context) returns.
+    db = replica_alias()
+    if request.GET.get('summary') == 'daily':
+        return _csv_response(reports.SUMMARY_HEADER, reports.daily_summary_rows(start, end, tx_type, db),
+                             'profit_summary.csv')
+    return _csv_response(reports.PROFIT_HEADER, reports.profit_rows(start, end, tx_type, db), 'profit_report.csv')
+
 
 
 @login_required
@@ -110,105 +148,156 @@ def admin_delete_user(request, user_id):
         messages.error(request, "You cannot delete the superuser account.")
         return redirect('admin_users')
 
-    user.delete()
+    try:
+        user.delete()
+    except ProtectedError:
+        messages.error(request, "This user has ledger history and cannot be deleted.")
+        return redirect('admin_users')
     messages.success(request, "User deleted successfully.")
     return redirect('admin_users')
 
 
 @login_required
-def dashboard(request):
-    account, _ = Account.objects.get_or_create(user=request.user)
-    today = timezone.localdate()
-    txs = Transaction.objects.filter(created_at__date=today).order_by('-created_at')[:10]
-    pending_withdraw = WithdrawalRequest.objects.filter(user=request.user, status=WithdrawalRequest.PENDING).order_by('-created_at')
-    return render(request, 'core/dashboard.html', {
+async def dashboard(request):
+    user = await request.auser()
+    day_start = timezone.make_aware(datetime.combine(timezone.localdate(), time.min))
+
+    async def account(f):
+        return await request.aaccount()
+
+    async def txs(f):
+        recent = (Transaction.objects.for_account(f['account']).filter(created_at__gte=day_start)
+                  .only('id', 'type', 'amount', 'fee', 'created_at').order_by('-created_at')[:10])
+        return [t async for t in recent]
+
+    async def pending_withdraw(f):
+        pending = (WithdrawalRequest.objects.pending().filter(user=user)
+                   .only('id', 'amount', 'created_at').order_by('-created_at'))
+        return [w async for w in pending]
+
+    data = await caching.afragments(user.id, {
         'account': account,
         'txs': txs,
         'pending_withdraw': pending_withdraw,
     })
+    return await arender(request, 'core/dashboard.html', data)
 
 @login_required
-def view_qr(request):
-    account, _ = Account.objects.get_or_create(user=request.user)
-    if not account.qr_image:
-        path_suffix = f"/account/{account.id}/pay/"
-        account.qr_image = generate_qr_image(path_suffix)
-        account.save()
-    pay_url = f"{settings.QR_BASE_URL}/account/{account.id}/pay/"
-    return render(request, 'core/account_qr.html', {'account': account, 'pay_url': pay_url})
+async def view_qr(request):
+    account = await request.aaccount()
+    qr_inline = None
+    if settings.QR_MODE == 'inline':
+        qr_inline = mark_safe(qr_svg(account.id))
+    else:
+        await sync_to_async(ensure_account_qr)(account)
+    pay_url = f"{settings.QR_BASE_URL}{pay_path(account.id)}"
+    return await arender(request, 'core/account_qr.html', {'account': account, 'pay_url': pay_url, 'qr_inline': qr_inline})
+
+@condition(etag_func=lambda request, name: name)
+def qr_png(request, name):
+    """Serve a content-addressed QR PNG; the name is a hash of its URL, so it can be cached forever."""
+    path = f"qrcodes/{name}"
+    if settings.QR_ACCEL_REDIRECT:
+        # Let nginx stream the file from MEDIA_ROOT (an `internal` location).
+        response = HttpResponse(content_type='image/png')
+        response['X-Accel-Redirect'] = f"{settings.QR_ACCEL_REDIRECT}{path}"
+    else:
+        try:
+            response = FileResponse(default_storage.open(path), content_type='image/png')
+        except FileNotFoundError:
+            raise Http404
+    response['Cache-Control'] = f"public, max-age={settings.QR_CACHE_MAX_AGE}, immutable"
+    return response
 
 @login_required
 def scan_qr(request):
     return render(request, 'core/scan.html')
 
 @login_required
-def pay_account(request, account_id):
-    target = get_object_or_404(Account, id=account_id)
-    me = Account.objects.get_or_create(user=request.user)[0]
+async def pay_account(request, account_id):
     if request.method == 'POST':
-        action = request.POST.get('action')
-        amount = Decimal(request.POST.get('amount','0') or '0')
-        note = request.POST.get('note','')
-        if amount <= 0:
-            messages.error(request, "Invalid amount.")
+        return await run_write(_pay_account_post, request, account_id)
+    target = await aget_object_or_404(Account.objects.select_related('user'), id=account_id)
+    return await arender(request, 'core/pay.html', {'target': target})
+
+@idempotent
+def _pay_account_post(request, account_id):
+    target = get_object_or_404(Account.objects.select_related('user'), id=account_id)
+    me = request.account
+    action = request.POST.get('action')
+    amount = Decimal(request.POST.get('amount','0') or '0')
+    note = request.POST.get('note','')
+    if amount <= 0:
+        messages.error(request, "Invalid amount.")
+        return redirect('pay_account', account_id=account_id)
+    if action == 'send':
+        if me.id == target.id:
+            messages.error(request, "Cannot send to self.")
             return redirect('pay_account', account_id=account_id)
-        if action == 'send':
-            if me.id == target.id:
-                messages.error(request, "Cannot send to self.")
-                return redirect('pay_account', account_id=account_id)
+        try:
             do_transfer(me, target, amount, note)
-            messages.success(request, f"Sent Rs.{amount} to {target.user.username}.")
-            return redirect('dashboard')
-        elif action == 'request':
-            MoneyRequest.objects.create(requester=target, target=me, amount=amount, note=note)
-            messages.success(request, f"Request of Rs.{amount} sent to {target.user.username}.")
-            return redirect('dashboard')
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect('pay_account', account_id=account_id)
+        messages.success(request, f"Sent Rs.{amount} to {target.user.username}.")
+        return redirect('dashboard')
+    elif action == 'request':
+        MoneyRequest.objects.create(requester=target, target=me, amount=amount, note=note)
+        messages.success(request, f"Request of Rs.{amount} sent to {target.user.username}.")
+        return redirect('dashboard')
     return render(request, 'core/pay.html', {'target': target})
 
-def fee_amount(amount: Decimal, percent: float):
-    return (amount * Decimal(str(percent)) / Decimal('100')).quantize(Decimal('0.01'))
-
-@transaction.atomic
 def do_transfer(from_acc: Account, to_acc: Account, amount: Decimal, note: str=''):
-    if from_acc.balance < amount:
-        raise ValueError("Insufficient funds")
-    fee = fee_amount(amount, settings.TRANSFER_FEE_PERCENT)
-    total = amount + fee
-    if from_acc.balance < total:
-        raise ValueError("Insufficient funds for amount + fee.")
-    from_acc.balance -= total
-    to_acc.balance += amount
-    from_acc.save()
-    to_acc.save()
-    tx = Transaction.objects.create(
-        from_account=from_acc, to_account=to_acc, amount=amount, fee=fee, type=Transaction.TRANSFER, note=note
-    )
-    ProfitRecord.objects.create(transaction=tx, amount=fee)
-    return tx
+    return ledger.transfer(from_acc, to_acc, amount, note)
 
 @login_required
+@idempotent
 def transfer(request):
-    account = Account.objects.get_or_create(user=request.user)[0]
+    account = request.account
     if request.method == 'POST':
         form = TransferForm(request.POST)
         if form.is_valid():
             to_username = form.cleaned_data['to_username']
             amount = form.cleaned_data['amount']
             note = form.cleaned_data.get('note','')
-            try:
-                to_user = User.objects.get(username=to_username)
-                to_acc = Account.objects.get_or_create(user=to_user)[0]
-                do_transfer(account, to_acc, amount, note)
-                messages.success(request, f"Transferred Rs.{amount} to {to_username}.")
-                return redirect('transactions')
-            except User.DoesNotExist:
+            to_acc = lookup.recipient(to_username)
+            if to_acc is None:
                 messages.error(request, "User not found.")
-            except ValueError as e:
-                messages.error(request, str(e))
+            else:
+                try:
+                    do_transfer(account, to_acc, amount, note)
+                    messages.success(request, f"Transferred Rs.{amount} to {to_username}.")
+                    return redirect('transactions')
+                except ValueError as e:
+                    messages.error(request, str(e))
     else:
         form = TransferForm()
     return render(request, 'core/transfer.html', {'form': form})
 
+@login_required
+@idempotent
+def bulk_transfer(request):
+    account = request.account
+    results = None
+    if request.method == 'POST':
+        form = BulkTransferForm(request.POST, request.FILES)
+        if form.is_valid():
+            upload = form.cleaned_data.get('file')
+            try:
+                data = upload.read().decode('utf-8-sig') if upload else form.cleaned_data['rows']
+                rows = parse_transfer_rows(data)
+            except UnicodeDecodeError:
+                messages.error(request, "Could not read the uploaded file: it is not UTF-8 text.")
+            except ValueError as e:
+                messages.error(request, f"Could not parse the uploaded rows: {e}")
+            else:
+                results = ledger.bulk_transfer(account, rows)
+                ok = sum(1 for r in results if r['ok'])
+                messages.success(request, f"{ok} of {len(results)} transfers completed.")
+    else:
+        form = BulkTransferForm()
+    return render(request, 'core/bulk_transfer.html', {'form': form, 'results': results, 'account': account})
+
 @login_required
 def withdraw(request):
     # User creates a withdrawal request (no immediate balance change)
@@ -218,47 +307,148 @@ def withdraw(request):
             amount = form.cleaned_data['amount']
             note = form.cleaned_data.get('note','')
             WithdrawalRequest.objects.create(user=request.user, amount=amount, note=note)
+            caching.invalidate(request.user.id)
             messages.success(request, f"Withdrawal request of Rs.{amount} submitted for admin approval.")
             return redirect('dashboard')
     else:
         form = WithdrawForm()
     return render(request, 'core/withdraw.html', {'form': form})
 
+async def _history_page(request, account):
+    cursor = request.GET.get('cursor')
+    before = decode_cursor(cursor) if cursor else None
+    txs, next_key = await Transaction.objects.ahistory(account, before=before, limit=settings.HISTORY_PAGE_SIZE)
+    return txs, (encode_cursor(next_key) if next_key else None)
+
 @login_required
-def transactions(request):
-    account = Account.objects.get_or_create(user=request.user)[0]
-    txs = Transaction.objects.filter(from_account=account) | Transaction.objects.filter(to_account=account)
-    txs = txs.order_by('-created_at')[:200]
-    return render(request, 'core/transactions.html', {'txs': txs})
+@read_from_replica
+async def transactions(request):
+    account = await request.aaccount()
+    try:
+        txs, next_cursor = await _history_page(request, account)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    return await arender(request, 'core/transactions.html', {'txs': txs, 'next_cursor': next_cursor})
+
+@login_required
+@read_from_replica
+async def transactions_api(request):
+    account = await request.aaccount()
+    try:
+        txs, next_cursor = await _history_page(request, account)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse({
+        'results': [{
+            'id': t.id,
+            'type': t.type,
+            'amount': str(t.amount),
+            'fee': str(t.fee),
+            'from': t.from_account.user.username if t.from_account else None,
+            'to': t.to_account.user.username if t.to_account else None,
+            'note': t.note,
+            'created_at': t.created_at.isoformat(),
+        } for t in txs],
+        'next_cursor': next_cursor,
+    })
 
 @login_required
-def requests_view(request):
-    account = Account.objects.get_or_create(user=request.user)[0]
-    incoming = MoneyRequest.objects.filter(target=account).order_by('-created_at')
-    outgoing = MoneyRequest.objects.filter(requester=account).order_by('-created_at')
-    return render(request, 'core/requests.html', {'incoming': incoming, 'outgoing': outgoing})
+def statements_view(request):
+    rows = Statement.objects.filter(account__user=request.user).order_by('-period_start')
+    return render(request, 'core/statements.html', {'statements': rows})
 
 @login_required
+def statement_download(request, statement_id, fmt):
+    statement = get_object_or_404(Statement.objects.select_related('account'), id=statement_id)
+    if statement.account.user_id != request.user.id and not request.user.is_superuser:
+        return HttpResponseForbidden("Not allowed.")
+    if fmt not in ('csv', 'pdf'):
+        raise Http404
+    path = statement.csv_path if fmt == 'csv' else statement.pdf_path
+    if not default_storage.exists(path):
+        raise Http404
+    return FileResponse(default_storage.open(path, 'rb'), as_attachment=True,
+                        filename=f"statement_{statement.period_start:%Y-%m}.{fmt}",
+                        content_type='text/csv' if fmt == 'csv' else 'application/pdf')
+
+@login_required
+def recipients_api(request):
+    """Username autocomplete for the transfer and deposit forms."""
+    limit = settings.RECIPIENT_SEARCH_LIMIT
+    matches = lookup.search(request.GET.get('q', ''), limit=limit + 1)
+    return JsonResponse({'results': [
+        {'username': username, 'account_id': account_id}
+        for username, account_id in matches if username != request.user.username
+    ][:limit]})
+
+@login_required
+async def requests_view(request):
+    account = await request.aaccount()
+    incoming = [r async for r in MoneyRequest.objects.filter(target=account).with_parties().order_by('-created_at')]
+    outgoing = [r async for r in MoneyRequest.objects.filter(requester=account).with_parties().order_by('-created_at')]
+    return await arender(request, 'core/requests.html', {
+        'incoming': incoming,
+        'outgoing': outgoing,
+        'has_pending': any(r.status == MoneyRequest.PENDING for r in incoming),
+    })
+
+@login_required
+@idempotent
 def approve_request(request, req_id):
-    req = get_object_or_404(MoneyRequest, id=req_id)
-    if req.target.user != request.user:
+    req = get_object_or_404(MoneyRequest.objects.select_related('requester__user', 'target'), id=req_id)
+    if req.target.user_id != request.user.id:
         return HttpResponseForbidden("Not allowed.")
     if req.status != MoneyRequest.PENDING:
         messages.info(request, "Request already processed.")
         return redirect('requests')
     try:
-        do_transfer(req.target, req.requester, req.amount, note=f"Approve request #{req.id}")
-        req.status = MoneyRequest.APPROVED
-        req.save()
+        ledger.approve_money_request(req)
         messages.success(request, f"Sent Rs.{req.amount} to {req.requester.user.username}.")
     except ValueError as e:
         messages.error(request, str(e))
     return redirect('requests')
 
+def _parse_ids(values):
+    try:
+        return [int(v) for v in values]
+    except ValueError:
+        raise ValueError("Invalid selection.")
+
+def _report_batch(request, results, verb):
+    done = sum(1 for r in results if r['ok'])
+    failed = [r for r in results if not r['ok']]
+    if done:
+        messages.success(request, f"{verb} {done} request(s).")
+    for r in failed[:10]:
+        messages.error(request, f"#{r['id']}: {r['error']}")
+    if len(failed) > 10:
+        messages.error(request, f"...and {len(failed) - 10} more failed.")
+
+@login_required
+@idempotent
+def requests_bulk(request):
+    if request.method != 'POST':
+        return redirect('requests')
+    try:
+        ids = _parse_ids(request.POST.getlist('ids'))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    if not ids:
+        messages.info(request, "Select at least one request.")
+        return redirect('requests')
+    account = request.account
+    if request.POST.get('action') == 'approve':
+        _report_batch(request, ledger.bulk_approve_money_requests(account, ids), "Paid")
+    elif request.POST.get('action') == 'reject':
+        _report_batch(request, ledger.bulk_reject_money_requests(account, ids), "Rejected")
+    else:
+        return HttpResponseBadRequest("Unknown action.")
+    return redirect('requests')
+
 @login_required
 def reject_request(request, req_id):
-    req = get_object_or_404(MoneyRequest, id=req_id)
-    if req.target.user != request.user:
+    req = get_object_or_404(MoneyRequest.objects.select_related('requester__user', 'target'), id=req_id)
+    if req.target.user_id != request.user.id:
         return HttpResponseForbidden("Not allowed.")
     if req.status == MoneyRequest.PENDING:
         req.status = MoneyRequest.REJECTED
@@ -269,20 +459,27 @@ def reject_request(request, req_id):
 @user_passes_test(is_admin)
 def admin_dashboard(request):
     today = timezone.localdate()
-    total_balance = Account.objects.aggregate(total=models.Sum('balance'))['total'] or Decimal('0.00')
-    today_profit = ProfitRecord.objects.filter(created_at__date=today).aggregate(total=models.Sum('amount'))['total'] or Decimal('0.00')
-    txs = Transaction.objects.order_by('-created_at')[:200]
-    pending_withdrawals = WithdrawalRequest.objects.filter(status=WithdrawalRequest.PENDING).order_by('-created_at')
+    total_balance = rollups.system_totals()['outstanding']
+    today_stats = rollups.day_totals(today)
+    txs = Transaction.objects.with_parties().order_by('-created_at')[:200]
+    pending_withdrawals = WithdrawalRequest.objects.pending().with_user().order_by('-created_at')
+    schedule = fees.current()
     return render(request, 'core/admin_dashboard.html', {
         'total_balance': total_balance,
-        'today_profit': today_profit,
+        'today_profit': today_stats['fees'],
+        'today_volumes': today_stats['by_type'].values(),
         'txs': txs,
-        'transfer_fee': settings.TRANSFER_FEE_PERCENT,
-        'deposit_fee': settings.DEPOSIT_FEE_PERCENT,
-        'withdraw_fee': settings.WITHDRAW_FEE_PERCENT,
+        'fee_schedule': schedule.version,
+        'transfer_fee': schedule.describe(Transaction.TRANSFER),
+        'deposit_fee': schedule.describe(Transaction.DEPOSIT),
+        'withdraw_fee': schedule.describe(Transaction.WITHDRAW),
         'pending_withdrawals': pending_withdrawals,
     })
 
+@user_passes_test(is_admin)
+def admin_cache_stats(request):
+    return JsonResponse(caching.stats())
+
 @user_passes_test(is_admin)
 def admin_deposit(request):
     # Admin deposits into a user's account (fee recorded)
@@ -292,42 +489,35 @@ def admin_deposit(request):
             username = form.cleaned_data['username']
             amount = form.cleaned_data['amount']
             note = form.cleaned_data.get('note','')
-            try:
-                user = User.objects.get(username=username)
-                acc = Account.objects.get_or_create(user=user)[0]
-                fee = fee_amount(amount, settings.DEPOSIT_FEE_PERCENT)
-                acc.balance += (amount - fee)
-                acc.save()
-                tx = Transaction.objects.create(from_account=None, to_account=acc, amount=amount, fee=fee, type=Transaction.DEPOSIT, note=f"Admin deposit: {note}")
-                ProfitRecord.objects.create(transaction=tx, amount=fee)
-                messages.success(request, f"Deposited Rs.{amount} (fee Rs.{fee}) to {username}.")
-                return redirect('admin_deposit')
-            except User.DoesNotExist:
+            acc = lookup.recipient(username)
+            if acc is None:
                 messages.error(request, "User not found.")
+            else:
+                try:
+                    tx = ledger.deposit(acc, amount, note=f"Admin deposit: {note}")
+                except ValueError as e:
+                    messages.error(request, str(e))
+                else:
+                    messages.success(request, f"Deposited Rs.{amount} (fee Rs.{tx.fee}) to {username}.")
+                    return redirect('admin_deposit')
     else:
         form = AdminDepositForm()
     return render(request, 'core/admin_deposit.html', {'form': form})
 
 @user_passes_test(is_admin)
-@transaction.atomic
 def admin_withdraw_approve(request, wid):
     wr = get_object_or_404(WithdrawalRequest, id=wid)
     if wr.status != WithdrawalRequest.PENDING:
         messages.info(request, "Already processed.")
         return redirect('admin_withdrawals')
-    acc = Account.objects.get_or_create(user=wr.user)[0]
-    fee = fee_amount(wr.amount, settings.WITHDRAW_FEE_PERCENT)
-    total = wr.amount + fee
-    if acc.balance < total:
-        messages.error(request, "Insufficient user balance for amount + fee.")
+    try:
+        ledger.approve_withdrawal(wr)
+    except ledger.AlreadyProcessed:
+        messages.info(request, "Already processed.")
+        return redirect('admin_withdrawals')
+    except ValueError as e:
+        messages.error(request, str(e))
         return redirect('admin_withdrawals')
-    # Deduct and record transaction
-    acc.balance -= total
-    acc.save()
-    tx = Transaction.objects.create(from_account=acc, to_account=None, amount=wr.amount, fee=fee, type=Transaction.WITHDRAW, note=f"Admin approved withdrawal #{wr.id}")
-    ProfitRecord.objects.create(transaction=tx, amount=fee)
-    wr.status = WithdrawalRequest.APPROVED
-    wr.save()
     messages.success(request, f"Withdrawal of Rs.{wr.amount} approved for {wr.user.username}.")
     return redirect('admin_withdrawals')
 
@@ -337,11 +527,127 @@ def admin_withdraw_reject(request, wid):
     if wr.status == WithdrawalRequest.PENDING:
         wr.status = WithdrawalRequest.REJECTED
         wr.save()
+        caching.invalidate(wr.user_id)
         messages.success(request, "Withdrawal request rejected.")
     return redirect('admin_withdrawals')
 
+@user_passes_test(is_admin)
+def admin_withdrawals_enqueue(request):
+    """Queue approval of every pending withdrawal as background jobs."""
+    if request.method != 'POST':
+        return redirect('admin_withdrawals')
+    ids = list(WithdrawalRequest.objects.pending().order_by('created_at', 'id').values_list('id', flat=True))
+    size = settings.JOB_WITHDRAWAL_BATCH
+    jobs.enqueue_many('withdrawals.approve', [{'ids': ids[i:i + size]} for i in range(0, len(ids), size)],
+                      priority=10, user=request.user)
+    messages.success(request, f"Queued {len(ids)} withdrawal(s) for approval.")
+    return redirect('admin_jobs')
+
+@user_passes_test(is_admin)
+def admin_report_enqueue(request):
+    if request.method != 'POST':
+        return redirect('admin_dashboard')
+    payload = {name: request.POST.get(name, '') for name in ('from', 'to', 'type', 'summary')}
+    try:
+        reports.parse_day(payload['from'])
+        reports.parse_day(payload['to'])
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('admin_dashboard')
+    jobs.enqueue('reports.profit_csv', payload, user=request.user)
+    messages.success(request, "Report queued; download it here when it is done.")
+    return redirect('admin_jobs')
+
+@user_passes_test(is_admin)
+def admin_qr_backfill(request):
+    if request.method == 'POST':
+        jobs.enqueue('qr.backfill', {'force': bool(request.POST.get('force'))}, priority=-1, user=request.user)
+        messages.success(request, "QR backfill queued.")
+    return redirect('admin_jobs')
+
+@user_passes_test(is_admin)
+def admin_statements_enqueue(request):
+    if request.method == 'POST':
+        month = request.POST.get('month', '')
+        try:
+            statements.month_bounds(month)
+        except ValueError as e:
+            messages.error(request, str(e))
+            return redirect('admin_jobs')
+        jobs.enqueue('statements.generate', {'month': month}, priority=-1, user=request.user)
+        messages.success(request, f"Statements for {month} queued.")
+    return redirect('admin_jobs')
+
+@user_passes_test(is_admin)
+def admin_jobs(request):
+    recent = Job.objects.select_related('created_by').defer('last_error').order_by('-created_at', '-id')
+    status = request.GET.get('status')
+    if status:
+        recent = recent.filter(status=status)
+    counts = jobs.status_counts()
+    return render(request, 'core/admin_jobs.html', {
+        'queue': [(name, label, counts[name]) for name, label in Job.STATUSES],
+        'jobs': recent[:200],
+        'failed': Job.objects.filter(status=Job.FAILED).order_by('-finished_at')[:20],
+        'status': status,
+        'last_month': statements.previous_month(),
+    })
+
+@user_passes_test(is_admin)
+def admin_job_retry(request, job_id):
+    if request.method == 'POST' and jobs.retry(job_id):
+        messages.success(request, f"Job #{job_id} re-queued.")
+    return redirect('admin_jobs')
+
+@user_passes_test(is_admin)
+def admin_job_download(request, job_id):
+    job = get_object_or_404(Job, id=job_id, task__in=('reports.profit_csv', 'users.import', 'statements.generate'),
+                            status=Job.DONE)
+    path = (job.result or {}).get('path')
+    if not path or not default_storage.exists(path):
+        messages.error(request, "The report file is no longer available.")
+        return redirect('admin_jobs')
+    return FileResponse(default_storage.open(path, 'rb'), as_attachment=True,
+                        filename=path.rsplit('/', 1)[-1], content_type='text/csv')
+
+@user_passes_test(is_admin)
+def admin_withdrawals_bulk(request):
+    if request.method != 'POST':
+        return redirect('admin_withdrawals')
+    try:
+        ids = _parse_ids(request.POST.getlist('ids'))
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+    if not ids:
+        messages.info(request, "Select at least one withdrawal.")
+    elif request.POST.get('action') == 'approve':
+        _report_batch(request, ledger.bulk_approve_withdrawals(ids), "Approved")
+    elif request.POST.get('action') == 'reject':
+        _report_batch(request, ledger.bulk_reject_withdrawals(ids), "Rejected")
+    else:
+        return HttpResponseBadRequest("Unknown action.")
+    return redirect('admin_withdrawals')
+
 @user_passes_test(is_admin)
 def admin_withdrawals(request):
-    pending = WithdrawalRequest.objects.filter(status=WithdrawalRequest.PENDING).order_by('-created_at')
-    processed = WithdrawalRequest.objects.exclude(status=WithdrawalRequest.PENDING).order_by('-created_at')[:200]
-    return render(request, 'core/admin_withdrawals.html', {'pending': pending, 'processed': processed})
+    # Keyset pages over the pending partial index, newest first.
+    page_size = settings.WITHDRAWALS_PAGE_SIZE
+    pending = WithdrawalRequest.objects.pending().with_user().order_by('-created_at', '-id')
+    if request.GET.get('cursor'):
+        try:
+            created_at, pk = decode_cursor(request.GET['cursor'])
+        except ValueError as e:
+            return HttpResponseBadRequest(str(e))
+        pending = pending.filter(models.Q(created_at__lt=created_at) | models.Q(created_at=created_at, id__lt=pk))
+    pending = list(pending[:page_size + 1])
+    next_cursor = None
+    if len(pending) > page_size:
+        pending = pending[:page_size]
+        next_cursor = encode_cursor((pending[-1].created_at, pending[-1].id))
+    processed = WithdrawalRequest.objects.exclude(status=WithdrawalRequest.PENDING).with_user().order_by('-created_at')[:200]
+    return render(request, 'core/admin_withdrawals.html', {
+        'pending': pending,
+        'pending_count': WithdrawalRequest.objects.pending().count(),
+        'next_cursor': next_cursor,
+        'processed': processed,
+    })
@@ -1,7 +1,8 @@
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.contrib.auth import views as auth_views
 from core import views as core_views
+from core.metrics import metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -10,11 +11,13 @@ urlpatterns = [
     path('', core_views.home, name='home'),
     path('u/', include('core.urls')),
     path('account/<int:account_id>/pay/', core_views.pay_account, name='pay_account'),
+    path('metrics', metrics_view, name='metrics'),
+    re_path(r'^media/qrcodes/(?P<name>[0-9a-f]{24}\.png)$', core_views.qr_png, name='qr_png'),
 ]
 
 from django.conf import settings
 from django.conf.urls.static import static
 
+# Static files are served by WhiteNoise (from the app finders in DEBUG).
 if settings.DEBUG:
     urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
-    urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
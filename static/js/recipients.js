@@ -0,0 +1,37 @@
+// Username autocomplete for inputs marked data-recipient-search
+(function () {
+  const url = document.currentScript.dataset.url;
+  const inputs = document.querySelectorAll('input[data-recipient-search]');
+  if (!inputs.length) return;
+
+  const list = document.createElement('datalist');
+  list.id = 'recipient-options';
+  document.body.appendChild(list);
+
+  let timer = null;
+  let lastQuery = '';
+
+  async function suggest(query) {
+    if (!query || query === lastQuery) return;
+    lastQuery = query;
+    try {
+      const response = await fetch(`${url}?q=${encodeURIComponent(query)}`, { credentials: 'same-origin' });
+      if (!response.ok) return;
+      const data = await response.json();
+      list.replaceChildren(...data.results.map((r) => {
+        const option = document.createElement('option');
+        option.value = r.username;
+        return option;
+      }));
+    } catch (e) {
+      // Autocomplete is a convenience; typing the full username still works.
+    }
+  }
+
+  inputs.forEach((input) => {
+    input.addEventListener('input', () => {
+      clearTimeout(timer);
+      timer = setTimeout(() => suggest(input.value.trim()), 150);
+    });
+  });
+})();